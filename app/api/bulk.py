@@ -0,0 +1,51 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api.dependencies import group_service, task_service
+from app.core.schemas.task import TaskBulkFilter, TaskBulkResult
+from app.core.service.group import TaskGroupService
+from app.core.service.task import TaskService
+from app.message.producer import publish_tasks
+from app.utils.logging import logger
+
+
+bulk_router = APIRouter(prefix="/bulk")
+
+def _bulk_result(action: str, matched: int, published: int, expected: int) -> TaskBulkResult:
+    result = TaskBulkResult(action=action, matched=matched, published=published)
+    if published < expected:
+        # Переход уже зафиксирован: неопубликованные задачи остаются new_task до повторного /bulk/requeue
+        logger.error(f"Bulk {action} published {published} of {expected} tasks")
+        raise HTTPException(status_code=503, detail=result.model_dump())
+    return result
+
+@bulk_router.post("/requeue", response_model=TaskBulkResult, tags=["Bulk"], description="Повторная постановка задач в очередь")
+async def requeue_tasks(task_filter: TaskBulkFilter, service: Annotated[TaskService, Depends(task_service)]):
+    logger.info(f"Bulk requeue: {task_filter.model_dump(exclude_none=True, exclude={'ids'})}")
+    tasks = await service.requeue_tasks(task_filter)
+    published = await publish_tasks(tasks)
+    return _bulk_result("requeue", len(tasks), published, len(tasks))
+
+@bulk_router.post("/cancel", response_model=TaskBulkResult, tags=["Bulk"], description="Массовая отмена ожидающих задач")
+async def cancel_tasks(
+    task_filter: TaskBulkFilter,
+    service: Annotated[TaskService, Depends(task_service)],
+    groups: Annotated[TaskGroupService, Depends(group_service)]
+):
+    logger.info(f"Bulk cancel: {task_filter.model_dump(exclude_none=True, exclude={'ids'})}")
+    tasks, group_ids = await service.cancel_tasks(task_filter)
+
+    # Отмена могла завершить группы отменённых задач - ставим их задачи обратного вызова
+    callbacks = await groups.finish_groups(group_ids)
+    published = await publish_tasks([(task.id, task.partition_key) for task in callbacks])
+    return _bulk_result("cancel", len(tasks), published, len(callbacks))
+
+@bulk_router.post("/retry-failed", response_model=TaskBulkResult, tags=["Bulk"], description="Повтор задач со статусом error")
+async def retry_failed_tasks(
+    service: Annotated[TaskService, Depends(task_service)],
+    task_filter: TaskBulkFilter | None = None
+):
+    logger.info("Bulk retry of failed tasks")
+    tasks = await service.retry_failed_tasks(task_filter)
+    published = await publish_tasks(tasks)
+    return _bulk_result("retry-failed", len(tasks), published, len(tasks))
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from app.core.schemas.db import PoolStats
+from app.db import pool_stats
+
+
+db_router = APIRouter(prefix="/db")
+
+@db_router.get("/pool", response_model=list[PoolStats], tags=["Monitoring"], description="Загрузка пулов соединений с БД")
+def get_pool_stats():
+    return pool_stats()
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Query
+
+from app.core.schemas.dead_letter import DeadLetterMessage, DeadLetterReplay, DeadLetterReplayResult, DeadLetterStats
+from app.message import dead_letter
+from app.utils.logging import logger
+
+
+dead_letter_router = APIRouter(prefix="/dead-letter")
+
+@dead_letter_router.get("/", response_model=list[DeadLetterMessage], tags=["Dead letter"], description="Просмотр отклонённых сообщений")
+async def peek_dead_letters(limit: int = Query(20, gt=0, le=1000)):
+    return await dead_letter.peek_dead_letters(limit)
+
+@dead_letter_router.get("/stats", response_model=DeadLetterStats, tags=["Dead letter"], description="Статистика отклонённых сообщений по типу ошибки")
+async def dead_letter_stats(limit: int = Query(10_000, gt=0, le=100_000)):
+    return await dead_letter.dead_letter_stats(limit)
+
+@dead_letter_router.post("/replay", response_model=DeadLetterReplayResult, tags=["Dead letter"], description="Повторная отправка сообщений в очередь задач")
+async def replay_dead_letters(replay: DeadLetterReplay):
+    logger.info(f"Replaying dead letters: {replay.model_dump(exclude_none=True)}")
+    return await dead_letter.replay_dead_letters(replay.limit, replay.batch_size, replay.rate)
+
+@dead_letter_router.delete("/", tags=["Dead letter"], description="Очистка очереди отклонённых сообщений")
+async def purge_dead_letters():
+    return {"purged": await dead_letter.purge_dead_letters()}
@@ -2,9 +2,15 @@ from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db import get_session
+from app.core.service.group import TaskGroupService
 from app.core.service.task import TaskService
 
 async def task_service(
     session: AsyncSession = Depends(get_session)
 ) -> TaskService:
-    return TaskService(session) 
\ No newline at end of file
+    return TaskService(session, read_replica=True)
+
+async def group_service(
+    session: AsyncSession = Depends(get_session)
+) -> TaskGroupService:
+    return TaskGroupService(session)
@@ -0,0 +1,34 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from app.api.dependencies import group_service
+from app.core.schemas.group import TaskGroupCreate, TaskGroupRead
+from app.core.service.group import TaskGroupService
+from app.message.producer import publish_tasks
+from app.utils.logging import logger
+
+
+group_router = APIRouter(prefix="/groups")
+
+@group_router.post("/", response_model=TaskGroupRead, tags=["Groups"], description="Создание группы задач")
+async def create_group(
+    group: TaskGroupCreate,
+    service: Annotated[TaskGroupService, Depends(group_service)],
+    idempotency_key: Annotated[str | None, Header(alias="Idempotency-Key", max_length=255)] = None
+):
+    logger.info(f"Creating task group of {len(group.tasks)} tasks")
+    db_group, tasks = await service.create_group(group, idempotency_key)
+
+    # Отправляем дочерние задачи в очередь для обработки
+    published = await publish_tasks(tasks, idempotency_key)
+    if published < len(tasks):
+        raise HTTPException(
+            status_code=503,
+            detail={"group_id": db_group.id, "matched": len(tasks), "published": published}
+        )
+
+    return db_group
+
+@group_router.get("/{group_id}", response_model=TaskGroupRead, tags=["Groups"], description="Прогресс группы задач")
+async def get_group(group_id: int, service: Annotated[TaskGroupService, Depends(group_service)]):
+    return await service.get_group(group_id)
@@ -1,35 +1,66 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header
 
-from app.api.dependencies import task_service
+from app.api.dependencies import group_service, task_service
 from app.core.schemas.task import TaskCreate, TaskRead
+from app.core.service.group import TaskGroupService
 from app.core.service.task import TaskService
 from app.db import StatusTask
-from app.message.producer import publish_task
+from app.message.producer import publish_cancel, publish_task, publish_tasks
 from app.utils.logging import logger
 
 
 task_router = APIRouter()
 
 @task_router.post("/", response_model=TaskRead, tags=["Tasks"], description="Публикация задачи")
-async def create_task(task: TaskCreate, service: Annotated[TaskService, Depends(task_service)]):
+async def create_task(
+    task: TaskCreate,
+    service: Annotated[TaskService, Depends(task_service)],
+    idempotency_key: Annotated[str | None, Header(alias="Idempotency-Key", max_length=255)] = None
+):
     logger.info(f"Creating new task: {task.title}")
-    db_task = service.create_task(task)
+    if idempotency_key:
+        db_task, needs_publish = await service.create_task_idempotent(task, idempotency_key)
+        # Повторный запрос - задача уже в работе или завершена
+        if not needs_publish:
+            return db_task
+    else:
+        db_task = await service.create_task(task)
 
     # Отправляем задачу в очередь для обработки
-    await publish_task(db_task.id)
+    await publish_task(db_task.id, db_task.partition_key, idempotency_key)
     
     return db_task
 
+@task_router.post("/{task_id}/cancel", response_model=TaskRead, tags=["Tasks"], description="Отмена задачи")
+async def cancel_task(
+    task_id: int,
+    service: Annotated[TaskService, Depends(task_service)],
+    groups: Annotated[TaskGroupService, Depends(group_service)]
+):
+    logger.info(f"Cancelling task: {task_id}")
+    task = await service.cancel_task(task_id)
+
+    # Выполняемую задачу отменяет воркер, которому она принадлежит.
+    # Отменённую здесь задачу воркер уже не захватит - захват условный
+    if task.status == StatusTask.PROCESS_TASK:
+        await publish_cancel(task_id)
+
+    if task.group_id and task.status == StatusTask.CANCELLED:
+        callbacks = await groups.finish_groups([task.group_id])
+        await publish_tasks([(callback.id, callback.partition_key) for callback in callbacks])
+
+    return task
+
 @task_router.get("/{task_id}", response_model=TaskRead, tags=["Tasks"], description="Получение информации о задаче")
-def get_task(task_id: int, service: Annotated[TaskService, Depends(task_service)]):
-    return service.get_task(task_id)
+async def get_task(task_id: int, service: Annotated[TaskService, Depends(task_service)]):
+    return await service.get_task(task_id)
 
 @task_router.get("/", response_model=list[TaskRead], tags=["Tasks"], description="Получение списка задач")
-def get_tasks(
+async def get_tasks(
     service: Annotated[TaskService, Depends(task_service)],
     status: StatusTask | None = None
 ):
     logger.info(f"Getting tasks with status: {status if status else 'All status tasks'}")
-    tasks = service.get_tasks(status)
+    tasks = await service.get_tasks(status)
     return tasks
\ No newline at end of file
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+class PoolStats(BaseModel):
+    engine: str
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    utilization: float
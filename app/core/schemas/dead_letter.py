@@ -0,0 +1,26 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+class DeadLetterMessage(BaseModel):
+    task_id: int | None = None
+    message_id: str | None = None
+    reason: str
+    error_type: str | None = None
+    error: str | None = None
+    queue: str | None = None
+    count: int = 0
+    died_at: datetime | None = None
+    retry_count: int = 0
+
+class DeadLetterStats(BaseModel):
+    scanned: int
+    by_error: dict[str, int] = Field(default_factory=dict)
+
+class DeadLetterReplay(BaseModel):
+    limit: int | None = Field(None, gt=0)
+    batch_size: int | None = Field(None, gt=0, le=10_000)
+    rate: float | None = Field(None, gt=0)
+
+class DeadLetterReplayResult(BaseModel):
+    replayed: int
+    failed: int = 0
@@ -0,0 +1,27 @@
+from datetime import datetime
+from pydantic import BaseModel, Field, computed_field
+from app.core.schemas.task import TaskCreate
+
+class TaskGroupCreate(BaseModel):
+    tasks: list[TaskCreate] = Field(..., min_length=1, max_length=10_000)
+    callback: TaskCreate | None = None
+
+class TaskGroupRead(BaseModel):
+    id: int
+    total: int
+    completed: int
+    failed: int
+    cancelled: int
+    callback_task_id: int | None = None
+    created_at: datetime
+    finished_at: datetime | None = None
+
+    @computed_field
+    @property
+    def pending(self) -> int:
+        return max(self.total - self.completed - self.failed - self.cancelled, 0)
+
+    @computed_field
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
@@ -1,5 +1,5 @@
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from app.db import StatusTask
 
 class TaskBase(BaseModel):
@@ -7,7 +7,10 @@ class TaskBase(BaseModel):
     description: str | None = Field(None, max_length=500)
 
 class TaskCreate(TaskBase):
-    pass
+    # Задачи с одинаковым ключом выполняются строго по порядку
+    partition_key: str | None = Field(None, max_length=255)
+    # Ограничение времени выполнения в секундах, по умолчанию TASK_TIMEOUT
+    timeout: float | None = Field(None, gt=0)
 
 class TaskUpdate(BaseModel):
     title: str | None = Field(..., max_length=90)
@@ -18,8 +21,30 @@ class TaskUpdate(BaseModel):
 
 class TaskRead(TaskBase):
     id: int
+    partition_key: str | None = None
+    group_id: int | None = None
+    timeout: float | None = None
     status: StatusTask
     created_at: datetime
     updated_at: datetime
     result: str | None = None
     error_message: str | None = None
+
+
+class TaskBulkFilter(BaseModel):
+    status: StatusTask | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    ids: list[int] | None = Field(None, max_length=100_000)
+
+    @model_validator(mode='after')
+    def check_not_empty(self):
+        # Пустой фильтр затронул бы всю таблицу
+        if not any((self.status, self.created_from, self.created_to, self.ids)):
+            raise ValueError("At least one filter field must be set")
+        return self
+
+class TaskBulkResult(BaseModel):
+    action: str
+    matched: int
+    published: int = 0
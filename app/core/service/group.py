@@ -0,0 +1,176 @@
+from collections import Counter, defaultdict
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, any_, bindparam, func, insert, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.schemas.group import TaskGroupCreate, TaskGroupRead
+from app.core.schemas.task import TaskRead
+from app.core.service.idempotency import insert_idempotent
+from app.db import StatusTask, Task, TaskGroup
+from app.utils.logging import logger
+from app.utils.tracing import traced
+
+
+# Статус задачи -> счётчик группы
+GROUP_COUNTERS = {
+    StatusTask.COMPLETED_TASK: "completed",
+    StatusTask.ERROR: "failed",
+    StatusTask.CANCELLED: "cancelled",
+}
+
+async def apply_group_deltas(
+    session: AsyncSession,
+    transitions: Iterable[tuple[Optional[int], StatusTask, StatusTask]]
+) -> None:
+    """Атомарно сдвигает счётчики групп по переходам (group_id, старый статус, новый статус).
+
+    Коммит остаётся за вызывающим, чтобы счётчики менялись в одной транзакции со статусами.
+    """
+    deltas: dict[int, Counter] = defaultdict(Counter)
+    for group_id, previous, status in transitions:
+        if group_id is None or previous == status:
+            continue
+        if previous in GROUP_COUNTERS:
+            deltas[group_id][GROUP_COUNTERS[previous]] -= 1
+        if status in GROUP_COUNTERS:
+            deltas[group_id][GROUP_COUNTERS[status]] += 1
+
+    for group_id, delta in deltas.items():
+        values = {
+            counter: getattr(TaskGroup, counter) + value
+            for counter, value in delta.items() if value
+        }
+        if values:
+            await session.execute(
+                update(TaskGroup)
+                .where(TaskGroup.id == group_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+
+class TaskGroupService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @traced()
+    async def create_group(
+        self,
+        group: TaskGroupCreate,
+        idempotency_key: Optional[str] = None
+    ) -> tuple[TaskGroupRead, List[tuple[int, Optional[str]]]]:
+        """Создаёт группу и все дочерние задачи, возвращает группу и задачи для публикации"""
+        callback = group.callback
+        values = {
+            "total": len(group.tasks),
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "callback_title": callback.title if callback else None,
+            "callback_description": callback.description if callback else None,
+            "callback_partition_key": callback.partition_key if callback else None,
+            "callback_timeout": callback.timeout if callback else None
+        }
+        if idempotency_key:
+            db_group = await insert_idempotent(
+                self.session,
+                TaskGroup,
+                {**values, "idempotency_key": idempotency_key}
+            )
+            if not db_group.inserted:
+                # Повтор после неудачной публикации: заново отдаём ещё не взятые в работу задачи
+                pending = await self.session.execute(
+                    select(Task.id, Task.partition_key)
+                    .where(Task.group_id == db_group.id, Task.status == StatusTask.NEW_TASK)
+                    .order_by(Task.id)
+                )
+                tasks = [tuple(row) for row in pending.all()]
+                await self.session.commit()
+                logger.info(f"Task group with idempotency key {idempotency_key} already exists: {db_group.id}")
+                return TaskGroupRead.model_validate(db_group, from_attributes=True), tasks
+        else:
+            db_group = TaskGroup(**values)
+            self.session.add(db_group)
+            await self.session.flush()
+
+        rows = await self.session.execute(
+            insert(Task).returning(Task.id, Task.partition_key),
+            [
+                {
+                    "title": task.title,
+                    "description": task.description,
+                    "partition_key": task.partition_key,
+                    "timeout": task.timeout,
+                    "group_id": db_group.id,
+                    "status": StatusTask.NEW_TASK
+                }
+                for task in group.tasks
+            ]
+        )
+        tasks = [tuple(row) for row in rows.all()]
+        await self.session.commit()
+        logger.info("Task group created", extra={"group_id": db_group.id, "total": db_group.total})
+        return TaskGroupRead.model_validate(db_group, from_attributes=True), tasks
+
+    @traced()
+    async def get_group(self, group_id: int) -> TaskGroupRead:
+        group = await self.session.get(TaskGroup, group_id)
+        if not group:
+            logger.warning(f"Task group with id {group_id} not found")
+            raise HTTPException(status_code=404, detail=f"Task group with id {group_id} not found")
+        return TaskGroupRead.model_validate(group, from_attributes=True)
+
+    @traced()
+    async def finish_groups(self, group_ids: Iterable[int]) -> List[TaskRead]:
+        """Отмечает завершённые группы и создаёт их задачи обратного вызова.
+
+        Условный UPDATE гарантирует, что группу завершит ровно один вызов,
+        даже если последние дочерние задачи закончились одновременно.
+        """
+        group_ids = list(group_ids)
+        if not group_ids:
+            return []
+
+        query = (
+            update(TaskGroup)
+            .where(
+                TaskGroup.id == any_(bindparam("group_ids", group_ids, type_=ARRAY(Integer))),
+                TaskGroup.finished_at.is_(None),
+                TaskGroup.completed + TaskGroup.failed + TaskGroup.cancelled >= TaskGroup.total
+            )
+            .values(finished_at=func.now())
+            .returning(
+                TaskGroup.id,
+                TaskGroup.callback_title,
+                TaskGroup.callback_description,
+                TaskGroup.callback_partition_key,
+                TaskGroup.callback_timeout
+            )
+            .execution_options(synchronize_session=False)
+        )
+        callbacks = []
+        for row in (await self.session.execute(query)).all():
+            logger.info("Task group finished", extra={"group_id": row.id})
+            if row.callback_title is None:
+                continue
+            task = Task(
+                title=row.callback_title,
+                description=row.callback_description,
+                partition_key=row.callback_partition_key,
+                timeout=row.callback_timeout,
+                status=StatusTask.NEW_TASK
+            )
+            self.session.add(task)
+            await self.session.flush()
+            await self.session.execute(
+                update(TaskGroup)
+                .where(TaskGroup.id == row.id)
+                .values(callback_task_id=task.id)
+                .execution_options(synchronize_session=False)
+            )
+            callbacks.append(task)
+
+        await self.session.commit()
+        return [TaskRead.model_validate(task, from_attributes=True) for task in callbacks]
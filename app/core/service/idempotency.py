@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Row, literal_column, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.utils.config import settings
+
+
+async def insert_idempotent(session: AsyncSession, model, values: dict) -> Row:
+    """Вставка по ключу идемпотентности за один запрос, коммит остаётся за вызывающим"""
+    query = pg_insert(model).values(**values)
+    query = query.on_conflict_do_update(
+        index_elements=[model.idempotency_key],
+        set_={"idempotency_key": query.excluded.idempotency_key}
+    ).returning(*model.__table__.columns, literal_column("xmax = 0").label("inserted"))
+
+    row = (await session.execute(query)).one()
+    expired_before = datetime.now(timezone.utc) - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    if not row.inserted and row.created_at < expired_before:
+        await session.execute(
+            update(model)
+            .where(model.id == row.id)
+            .values(idempotency_key=None)
+            .execution_options(synchronize_session=False)
+        )
+        row = (await session.execute(query)).one()
+    return row
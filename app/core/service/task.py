@@ -1,45 +1,85 @@
+from contextlib import nullcontext
 from typing import List, Optional
 
 from fastapi import HTTPException
-from sqlalchemy import select
-from app.db import StatusTask, Task
-from core.schemas.task import TaskCreate, TaskRead, TaskUpdate
+from sqlalchemy import Integer, any_, bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.core.service.group import apply_group_deltas
+from app.core.service.idempotency import insert_idempotent
+from app.db import StatusTask, Task, is_recently_written, mark_written, use_replica
+from app.core.schemas.task import TaskBulkFilter, TaskCreate, TaskRead, TaskUpdate
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils.logging import logger
+from app.utils.tracing import traced
 
 
 class TaskService:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, read_replica: bool = False):
         self.session = session
+        # Чтения из реплик допустимы только там, где не важна свежесть статуса (API)
+        self.read_replica = read_replica
 
-    async def _get_by_id(self, key: int) -> Task:
-        task = await self.session.get(Task, key)
+    async def _get_by_id(self, key: int, **options) -> Task:
+        task = await self.session.get(Task, key, **options)
         if not task:
             logger.warning(f"Task with id {key} not found")
             raise HTTPException(status_code=404, detail=f"Task with id {key} not found")
         return task
 
+    @traced()
     async def create_task(self, task: TaskCreate) -> TaskRead:
         task = Task(
             title=task.title,
             description=task.description,
+            partition_key=task.partition_key,
+            timeout=task.timeout,
             status=StatusTask.NEW_TASK
         )
-        await self.session.add(task)
+        self.session.add(task)
         await self.session.commit()
+        mark_written(task.id)
         return TaskRead.model_validate(task, from_attributes=True)
 
+    @traced()
+    async def create_task_idempotent(self, task: TaskCreate, idempotency_key: str) -> tuple[TaskRead, bool]:
+        """Создание задачи с ключом идемпотентности, возвращает задачу и признак, что её нужно опубликовать"""
+        row = await insert_idempotent(self.session, Task, {
+            "title": task.title,
+            "description": task.description,
+            "partition_key": task.partition_key,
+            "idempotency_key": idempotency_key,
+            "timeout": task.timeout,
+            "status": StatusTask.NEW_TASK
+        })
+        await self.session.commit()
+        mark_written(row.id)
+        if not row.inserted:
+            logger.info(f"Task with idempotency key {idempotency_key} already exists: {row.id}")
+        # Первая попытка могла сохранить задачу, но не опубликовать её - публикуем повторно,
+        # пока задача не взята в работу; лишнюю доставку отсеет claim_task
+        return TaskRead.model_validate(row, from_attributes=True), row.inserted or row.status == StatusTask.NEW_TASK
+
+    @traced()
     async def get_task(self, task_id: int) -> TaskRead:
+        if self.read_replica and not is_recently_written(task_id):
+            with use_replica(self.session):
+                task = await self.session.get(Task, task_id)
+            # Реплика может отставать: не найденную задачу ищем на primary
+            if task:
+                return TaskRead.model_validate(task, from_attributes=True)
         result = await self._get_by_id(task_id)
         return TaskRead.model_validate(result, from_attributes=True)
         
+    @traced()
     async def get_tasks(self, status: Optional[StatusTask] = None) -> List[TaskRead]:
         query = select(Task)
         if status:
             query = query.filter(Task.status == status)
-        results = (await self.session.execute(query)).all()
+        with use_replica(self.session) if self.read_replica else nullcontext():
+            results = (await self.session.execute(query)).scalars().all()
         return [TaskRead.model_validate(result, from_attributes=True) for result in results]
 
+    @traced()
     async def update_task(self, task_id: int, task_update: TaskUpdate) -> Optional[Task]:
         task = await self._get_by_id(task_id)
         update_data = task_update.model_dump(exclude_unset=True)
@@ -47,5 +87,153 @@ class TaskService:
             setattr(task, key, value)
         
         await self.session.commit()
+        mark_written(task_id)
         await self.session.refresh(task)
         return TaskRead.model_validate(task, from_attributes=True)
+
+    @traced()
+    async def update_task_status(
+        self,
+        task_id: int,
+        status: StatusTask,
+        result: Optional[str] = None,
+        error_message: Optional[str] = None
+    ) -> TaskRead:
+        # Прежний статус читается из БД под блокировкой строки, а не из identity map:
+        # иначе переход, сделанный API или массовой операцией, счётчики группы учтут дважды
+        task = await self._get_by_id(task_id, with_for_update=True, populate_existing=True)
+        previous = task.status
+        task.status = status
+        if result is not None:
+            task.result = result
+        if error_message is not None:
+            task.error_message = error_message
+
+        # Счётчики группы меняются в той же транзакции, что и статус
+        await apply_group_deltas(self.session, [(task.group_id, previous, status)])
+        await self.session.commit()
+        mark_written(task_id)
+        return TaskRead.model_validate(task, from_attributes=True)
+
+    @traced()
+    async def claim_task(self, task_id: int) -> Optional[TaskRead]:
+        """Захват задачи воркером: только из new_task, None - задача уже не ожидает обработки"""
+        # Условный UPDATE: отмена не перезаписывается, повторная доставка задачу не запускает.
+        # Счётчики групп не меняются - new_task и process_task в них не учитываются
+        query = (
+            update(Task)
+            .where(Task.id == task_id, Task.status == StatusTask.NEW_TASK)
+            .values(status=StatusTask.PROCESS_TASK, updated_at=func.now())
+            .returning(*Task.__table__.columns)
+            .execution_options(synchronize_session=False)
+        )
+        row = (await self.session.execute(query)).one_or_none()
+        await self.session.commit()
+        if row is None:
+            return None
+        mark_written(task_id)
+        return TaskRead.model_validate(row, from_attributes=True)
+
+    def _bulk_conditions(self, task_filter: TaskBulkFilter) -> list:
+        conditions = []
+        if task_filter.status:
+            conditions.append(Task.status == task_filter.status)
+        if task_filter.created_from:
+            conditions.append(Task.created_at >= task_filter.created_from)
+        if task_filter.created_to:
+            conditions.append(Task.created_at < task_filter.created_to)
+        if task_filter.ids:
+            # Один параметр-массив вместо IN (...) - у asyncpg лимит 32767 параметров
+            ids = bindparam("ids", task_filter.ids, type_=ARRAY(Integer))
+            conditions.append(Task.id == any_(ids))
+        return conditions
+
+    @traced()
+    async def _bulk_transition(
+        self,
+        conditions: list,
+        allowed: List[StatusTask],
+        **values
+    ) -> tuple[List[tuple[int, Optional[str]]], set[int]]:
+        """Перевод всех подходящих задач одним UPDATE ... RETURNING, возвращает задачи и их группы"""
+        # Прежний статус нужен для пересчёта счётчиков групп
+        previous = (
+            select(Task.id, Task.status, Task.group_id)
+            .where(Task.status.in_(allowed), *conditions)
+            .with_for_update()
+            .cte("previous")
+        )
+        query = (
+            update(Task)
+            .where(Task.id == previous.c.id)
+            .values(updated_at=func.now(), **values)
+            .returning(Task.id, Task.partition_key, previous.c.group_id, previous.c.status)
+            .execution_options(synchronize_session=False)
+        )
+        rows = (await self.session.execute(query)).all()
+        await apply_group_deltas(
+            self.session,
+            ((group_id, status, values["status"]) for _, _, group_id, status in rows)
+        )
+        await self.session.commit()
+        tasks = [(task_id, partition_key) for task_id, partition_key, _, _ in rows]
+        group_ids = {group_id for _, _, group_id, _ in rows if group_id is not None}
+        logger.info(
+            "Bulk transition applied",
+            extra={"status": values.get("status"), "count": len(tasks)}
+        )
+        return tasks, group_ids
+
+    async def requeue_tasks(self, task_filter: TaskBulkFilter) -> List[tuple[int, Optional[str]]]:
+        tasks, _ = await self._bulk_transition(
+            self._bulk_conditions(task_filter),
+            [StatusTask.NEW_TASK, StatusTask.ERROR, StatusTask.COMPLETED_TASK, StatusTask.CANCELLED],
+            status=StatusTask.NEW_TASK,
+            result=None,
+            error_message=None
+        )
+        return tasks
+
+    async def cancel_tasks(
+        self,
+        task_filter: TaskBulkFilter,
+        reason: str = "Cancelled by bulk operation"
+    ) -> tuple[List[tuple[int, Optional[str]]], set[int]]:
+        """Отмена ожидающих задач по фильтру, возвращает отменённые задачи и затронутые группы"""
+        # error - конечный статус, как и для cancel_task: вернуть в работу можно только через retry-failed
+        return await self._bulk_transition(
+            self._bulk_conditions(task_filter),
+            [StatusTask.NEW_TASK],
+            status=StatusTask.CANCELLED,
+            error_message=reason
+        )
+
+    @traced()
+    async def cancel_task(self, task_id: int) -> TaskRead:
+        """Отмена задачи: ожидающая отменяется сразу, выполняемую отменяет воркер, завершённая - 409"""
+        await self._bulk_transition(
+            self._bulk_conditions(TaskBulkFilter(ids=[task_id])),
+            [StatusTask.NEW_TASK],
+            status=StatusTask.CANCELLED,
+            error_message="Cancelled by request"
+        )
+        mark_written(task_id)
+        self.session.expire_all()
+        task = await self.get_task(task_id)
+        if task.status in (StatusTask.COMPLETED_TASK, StatusTask.ERROR):
+            logger.warning(f"Task with id {task_id} is already {task.status.value}")
+            raise HTTPException(status_code=409, detail=f"Task with id {task_id} is already {task.status.value}")
+        return task
+
+    async def retry_failed_tasks(
+        self,
+        task_filter: Optional[TaskBulkFilter] = None
+    ) -> List[tuple[int, Optional[str]]]:
+        conditions = self._bulk_conditions(task_filter) if task_filter else []
+        tasks, _ = await self._bulk_transition(
+            conditions,
+            [StatusTask.ERROR],
+            status=StatusTask.NEW_TASK,
+            error_message=None
+        )
+        return tasks
@@ -1,10 +1,16 @@
-from .config import engine, get_session
-from .models import Base, Task, StatusTask
+from .config import async_session, engine, get_session, is_recently_written, mark_written, pool_stats, use_replica
+from .models import Base, Task, TaskGroup, StatusTask
 
 __all__ = [
     'Base',
     'Task',
+    'TaskGroup',
     'StatusTask',
     'engine',
-    'get_session'
+    'async_session',
+    'get_session',
+    'use_replica',
+    'mark_written',
+    'is_recently_written',
+    'pool_stats'
 ]
@@ -1,11 +1,87 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+import random
+import time
+from contextlib import contextmanager
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 from app.utils.config import settings
 
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
-async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+def _create_engine(url) -> AsyncEngine:
+    return create_async_engine(
+        str(url),
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            # Кэш подготовленных выражений SQLAlchemy и самого asyncpg (0 - для pgbouncer)
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+    )
+
+engine = _create_engine(settings.DATABASE_URL)
+replica_engines = [_create_engine(url) for url in settings.DATABASE_REPLICA_URLS]
+
+class RoutingSession(Session):
+    """Сессия, отправляющая SELECT в реплики внутри use_replica()"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (
+            replica_engines
+            and self.info.get("use_replica")
+            and not self._flushing
+            and getattr(clause, "is_select", False)
+        ):
+            return random.choice(replica_engines).sync_engine
+        return engine.sync_engine
+
+async_session = sessionmaker(class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False)
 
 async def get_session():
     async with async_session() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+@contextmanager
+def use_replica(session: AsyncSession):
+    """Чтение из реплики в пределах блока"""
+    session.info["use_replica"] = True
+    try:
+        yield
+    finally:
+        session.info.pop("use_replica", None)
+
+
+# Недавно записанные задачи читаются с primary (read-your-writes).
+# Словарь свой у каждого процесса: гарантия действует только для чтений в том же
+# процессе API, запрос в другой процесс может прочитать отстающий статус с реплики
+_recent_writes: dict[int, float] = {}
+
+def mark_written(key: int) -> None:
+    now = time.monotonic()
+    _recent_writes[key] = now + settings.DB_READ_STICKINESS
+    if len(_recent_writes) > 10_000:
+        for stale in [k for k, expires in _recent_writes.items() if expires < now]:
+            del _recent_writes[stale]
+
+def is_recently_written(key: int) -> bool:
+    expires = _recent_writes.get(key)
+    return expires is not None and expires > time.monotonic()
+
+def pool_stats() -> list[dict]:
+    """Загрузка пулов соединений primary и реплик"""
+    stats = []
+    for name, db_engine in [("primary", engine), *((f"replica-{i}", e) for i, e in enumerate(replica_engines))]:
+        pool = db_engine.pool
+        capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+        stats.append({
+            "engine": name,
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "utilization": pool.checkedout() / capacity if capacity else 0.0,
+        })
+    return stats
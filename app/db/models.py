@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 from enum import StrEnum
-from sqlalchemy import DateTime, Enum, String, Text
+from sqlalchemy import DateTime, Enum, Float, ForeignKey, Integer, String, Text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 class Base(DeclarativeBase):
@@ -12,6 +12,7 @@ class StatusTask(StrEnum):
     PROCESS_TASK = "process_task"
     COMPLETED_TASK = "completed_task"
     ERROR = "error"
+    CANCELLED = "cancelled"
 
 class Task(Base):
     """Модель таблицы задач"""
@@ -20,6 +21,10 @@ class Task(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(90))
     description: Mapped[str] = mapped_column(Text, nullable=True)
+    partition_key: Mapped[str] = mapped_column(String(255), nullable=True, index=True)
+    group_id: Mapped[int] = mapped_column(ForeignKey("task_group.id"), nullable=True, index=True)
+    idempotency_key: Mapped[str] = mapped_column(String(255), nullable=True, unique=True)
+    timeout: Mapped[float] = mapped_column(Float, nullable=True)
     status: Mapped[StatusTask] = mapped_column(Enum(StatusTask), default=StatusTask.NEW_TASK)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
@@ -31,4 +36,25 @@ class Task(Base):
         onupdate=datetime.now(timezone.utc)
     )
     result: Mapped[str] = mapped_column(String(255), nullable=True)
-    error_message: Mapped[str] = mapped_column(Text, nullable=True)
\ No newline at end of file
+    error_message: Mapped[str] = mapped_column(Text, nullable=True)
+
+class TaskGroup(Base):
+    """Модель группы задач со счётчиками завершения"""
+    __tablename__ = "task_group"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    total: Mapped[int] = mapped_column(Integer)
+    completed: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    cancelled: Mapped[int] = mapped_column(Integer, default=0)
+    callback_title: Mapped[str] = mapped_column(String(90), nullable=True)
+    callback_description: Mapped[str] = mapped_column(Text, nullable=True)
+    callback_partition_key: Mapped[str] = mapped_column(String(255), nullable=True)
+    callback_timeout: Mapped[float] = mapped_column(Float, nullable=True)
+    callback_task_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    idempotency_key: Mapped[str] = mapped_column(String(255), nullable=True, unique=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc)
+    )
+    finished_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
\ No newline at end of file
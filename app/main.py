@@ -1,6 +1,16 @@
 from fastapi import FastAPI
+from app.utils.tracing import exporter
 from api.tasks import task_router
+from api.bulk import bulk_router
+from api.dead_letter import dead_letter_router
+from api.groups import group_router
+from api.db import db_router
 
 app = FastAPI(title="Task Service")
+app.add_event_handler("shutdown", exporter.shutdown)
 
-app.include_router(task_router)
\ No newline at end of file
+app.include_router(task_router)
+app.include_router(bulk_router)
+app.include_router(dead_letter_router)
+app.include_router(group_router)
+app.include_router(db_router)
\ No newline at end of file
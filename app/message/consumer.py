@@ -1,10 +1,56 @@
+import asyncio
 import json
 import aio_pika
-from aio_pika.abc import AbstractIncomingMessage
+from aio_pika.abc import AbstractConnection, AbstractExchange, AbstractIncomingMessage, AbstractQueue
+from app.message.dead_letter import dead_letter_message, declare_dead_letter_queue
+from app.message.producer import declare_control_exchange
+from app.message.sharding import consumer_priority, declare_shard_queue, worker_id
 from app.utils.config import settings
 from app.utils.logging import logger
-from app.worker.process import process_task
-from tenacity import retry, stop_after_attempt, wait_random_exponential
+from app.utils.tracing import extract, start_span
+from app.worker.process import cancel_running_task, process_task
+
+async def _consume_queue(queue: AbstractQueue, **consume_kwargs):
+    """Последовательная обработка сообщений очереди"""
+    dead_letters = await queue.channel.get_exchange(settings.RABBITMQ_DEAD_LETTER_EXCHANGE, ensure=False)
+    async with queue.iterator(**consume_kwargs) as queue_iter:
+        async for message in queue_iter:
+            try:
+                await process_single_message(message, dead_letters)
+            except Exception as e:
+                logger.error("Message processing failed: %s", e)
+                if not message.processed:
+                    await message.reject(requeue=False)
+
+async def _consume_shard(connection: AbstractConnection, shard: int, worker: str):
+    """Подписка на шард: активна только реплика с наибольшим приоритетом"""
+    channel = await connection.channel()
+    await channel.set_qos(prefetch_count=settings.WORKER_PREFETCH_COUNT)
+    queue = await declare_shard_queue(channel, shard)
+    priority = consumer_priority(worker, shard)
+
+    logger.info(
+        "Shard consumer started",
+        extra={"queue": queue.name, "worker": worker, "priority": priority}
+    )
+    await _consume_queue(queue, arguments={"x-priority": priority})
+
+async def _consume_control(connection: AbstractConnection):
+    """Приём широковещательных команд: каждый воркер получает свою копию"""
+    channel = await connection.channel()
+    exchange = await declare_control_exchange(channel)
+    queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+    await queue.bind(exchange)
+
+    async with queue.iterator(no_ack=True) as queue_iter:
+        async for message in queue_iter:
+            try:
+                command = json.loads(message.body.decode())
+            except json.JSONDecodeError as e:
+                logger.error("JSON decode error: %s", str(e))
+                continue
+            if command.get("action") == "cancel" and command.get("task_id"):
+                cancel_running_task(command["task_id"])
 
 async def consume_tasks():
     connection = None
@@ -19,25 +65,29 @@ async def consume_tasks():
         async with connection:
             channel = await connection.channel()
             await channel.set_qos(prefetch_count=10)
+            await declare_dead_letter_queue(channel)
             
             queue = await channel.declare_queue(
                 settings.RABBITMQ_TASK_QUEUE,
                 durable=True,
                 arguments={
                     "x-queue-type": "quorum",
-                    "x-dead-letter-exchange": "dead_letter_exchange"
+                    "x-dead-letter-exchange": settings.RABBITMQ_DEAD_LETTER_EXCHANGE
                 }
             )
             
             logger.info("Consumer started for queue: %s", queue.name)
             
-            async with queue.iterator() as queue_iter:
-                async for message in queue_iter:
-                    try:
-                        await process_single_message(message)
-                    except Exception as e:
-                        logger.error("Message processing failed: %s", e)
-                        await message.reject(requeue=False)
+            # Шарды обрабатываются параллельно, сообщения внутри шарда - по порядку
+            worker = worker_id()
+            await asyncio.gather(
+                _consume_queue(queue),
+                _consume_control(connection),
+                *(
+                    _consume_shard(connection, shard, worker)
+                    for shard in range(settings.RABBITMQ_SHARD_COUNT)
+                )
+            )
 
     except Exception as e:
         logger.critical("Consumer crashed: %s", e)
@@ -45,31 +95,39 @@ async def consume_tasks():
             await connection.close()
         raise
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_random_exponential(multiplier=1, max=10)
-)
-async def process_single_message(message: AbstractIncomingMessage):
-    """Обработка с повторными попытками"""
-    async with message.process():
+async def process_single_message(
+    message: AbstractIncomingMessage,
+    dead_letters: AbstractExchange | None = None
+):
+    """Обработка сообщения, при сбое - перенос в DLX с типом ошибки.
+
+    Повторные попытки выполняет process_task, здесь сообщение обрабатывается один раз.
+    """
+    async with message.process(ignore_processed=True):
         try:
-            body = message.body.decode()
-            data = json.loads(body)
-            task_id = data.get("task_id")
-            
-            if not task_id:
-                logger.warning("Invalid message format: missing task_id")
-                return
+            # Интервал продолжает трассу, начатую при публикации
+            with start_span("amqp.consume", parent=extract(message.headers)) as span:
+                body = message.body.decode()
+                data = json.loads(body)
+                task_id = data.get("task_id")
                 
-            logger.info(
-                "Processing task message",
-                extra={
-                    "task_id": task_id,
-                    "headers": message.headers
-                }
-            )
-            
-            await process_task(task_id)
+                if not task_id:
+                    logger.warning("Invalid message format: missing task_id")
+                    return
+                    
+                logger.info(
+                    "Processing task message",
+                    extra={
+                        "task_id": task_id,
+                        "headers": message.headers
+                    }
+                )
+                span.set_attribute("task_id", task_id)
+                span.set_attribute("message_id", message.message_id)
+
+                # Повторную доставку отсеивает условный захват задачи в БД:
+                # он работает и после перезапуска воркера, в отличие от кэша в памяти
+                await process_task(task_id)
             
         except json.JSONDecodeError as e:
             logger.error("JSON decode error: %s", str(e))
@@ -81,5 +139,6 @@ async def process_single_message(message: AbstractIncomingMessage):
                 str(e),
                 exc_info=True
             )
-            await message.reject(requeue=False)
-            raise
\ No newline at end of file
+            if dead_letters is None:
+                raise
+            await dead_letter_message(dead_letters, message, e)
\ No newline at end of file
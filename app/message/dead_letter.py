@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+import aio_pika
+from typing import Callable
+from aio_pika.abc import AbstractChannel, AbstractExchange, AbstractIncomingMessage, AbstractQueue
+from app.core.schemas.dead_letter import DeadLetterMessage, DeadLetterReplayResult, DeadLetterStats
+from app.core.schemas.task import TaskBulkFilter
+from app.core.service.task import TaskService
+from app.db import async_session
+from app.message.producer import get_rabbitmq_connection
+from app.utils.config import settings
+from app.utils.logging import logger
+
+# Служебные заголовки DLQ, которые не переносятся при повторной отправке
+_DEAD_LETTER_HEADERS = (
+    "x-death",
+    "x-error-type",
+    "x-error-message",
+    "x-original-exchange",
+    "x-original-routing-key"
+)
+
+async def declare_dead_letter_queue(channel: AbstractChannel) -> AbstractQueue:
+    """Объявляет обменник и очередь для отклонённых сообщений"""
+    exchange = await channel.declare_exchange(
+        settings.RABBITMQ_DEAD_LETTER_EXCHANGE,
+        aio_pika.ExchangeType.FANOUT,
+        durable=True
+    )
+    queue = await channel.declare_queue(
+        settings.RABBITMQ_DEAD_LETTER_QUEUE,
+        durable=True,
+        arguments={
+            "x-queue-type": "quorum"
+        }
+    )
+    await queue.bind(exchange)
+    return queue
+
+def _decode(value) -> str | None:
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+def _copy_message(message: AbstractIncomingMessage, headers: dict) -> aio_pika.Message:
+    """Копия сообщения с исходными свойствами: message_id - ключ идемпотентности задачи"""
+    return aio_pika.Message(
+        body=message.body,
+        headers=headers,
+        content_type=message.content_type,
+        content_encoding=message.content_encoding,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        priority=message.priority,
+        correlation_id=message.correlation_id,
+        reply_to=message.reply_to,
+        message_id=message.message_id,
+        timestamp=message.timestamp,
+        type=message.type,
+        app_id=message.app_id
+    )
+
+async def dead_letter_message(
+    exchange: AbstractExchange,
+    message: AbstractIncomingMessage,
+    error: BaseException
+) -> None:
+    """Переносит сообщение в DLX с типом ошибки в заголовке и подтверждает исходное"""
+    headers = {
+        **(message.headers or {}),
+        "x-error-type": type(error).__name__,
+        "x-error-message": str(error)[:1000],
+        # x-death ставит только брокер, исходный маршрут нужен для повторной отправки
+        "x-original-exchange": message.exchange or "",
+        "x-original-routing-key": message.routing_key or ""
+    }
+    await exchange.publish(_copy_message(message, headers), routing_key=message.routing_key or "")
+    await message.ack()
+
+def _parse_message(message: AbstractIncomingMessage) -> DeadLetterMessage:
+    """Разбор сообщения и первой записи x-death"""
+    headers = message.headers or {}
+    deaths = headers.get("x-death") or [{}]
+    death = deaths[0]
+    try:
+        task_id = json.loads(message.body.decode()).get("task_id")
+    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+        task_id = None
+
+    return DeadLetterMessage(
+        task_id=task_id,
+        message_id=message.message_id,
+        reason=_decode(death.get("reason")) or ("error" if headers.get("x-error-type") else "unknown"),
+        error_type=_decode(headers.get("x-error-type")),
+        error=_decode(headers.get("x-error-message")),
+        queue=_decode(death.get("queue")),
+        count=death.get("count", 0),
+        died_at=death.get("time"),
+        retry_count=headers.get("retry_count", 0)
+    )
+
+def _origin(message: AbstractIncomingMessage) -> tuple[str, str]:
+    """Исходные обменник и ключ маршрутизации: для задач с ключом партиции - их шард"""
+    headers = message.headers or {}
+    death = (headers.get("x-death") or [{}])[0]
+    routing_keys = death.get("routing-keys") or []
+    if "exchange" in death and routing_keys:
+        return _decode(death["exchange"]) or "", _decode(routing_keys[0])
+    if "x-original-routing-key" in headers:
+        return _decode(headers.get("x-original-exchange")) or "", _decode(headers["x-original-routing-key"])
+    return "", settings.RABBITMQ_TASK_QUEUE
+
+def _error_type(entry: DeadLetterMessage) -> str:
+    # Без заголовка сообщение отклонено брокером: rejected, expired, delivery_limit
+    return entry.error_type or entry.reason
+
+async def _reset_failed_tasks(batch: list[AbstractIncomingMessage]) -> None:
+    """Возврат задач из error в new_task, иначе воркер не захватит повторённое сообщение"""
+    task_ids = [entry.task_id for entry in map(_parse_message, batch) if entry.task_id is not None]
+    if not task_ids:
+        return
+    async with async_session() as session:
+        await TaskService(session).retry_failed_tasks(TaskBulkFilter(ids=task_ids))
+
+async def _scan_dead_letters(
+    channel: AbstractChannel,
+    queue: AbstractQueue,
+    limit: int,
+    visit: Callable[[AbstractIncomingMessage], None]
+) -> None:
+    """Проход по DLQ: прочитанное сообщение копируется в хвост очереди и подтверждается"""
+    # Не больше, чем было в очереди на момент объявления - иначе встретим свои же копии
+    remaining = min(limit, queue.declaration_result.message_count)
+    while remaining > 0:
+        batch = []
+        for _ in range(min(remaining, settings.DLQ_REPLAY_BATCH_SIZE)):
+            message = await queue.get(fail=False)
+            if message is None:
+                break
+            batch.append(message)
+        if not batch:
+            break
+
+        for message in batch:
+            visit(message)
+        await asyncio.gather(*(
+            channel.default_exchange.publish(
+                _copy_message(message, message.headers or {}),
+                routing_key=queue.name
+            )
+            for message in batch
+        ))
+        await asyncio.gather(*(message.ack() for message in batch))
+        remaining -= len(batch)
+
+async def peek_dead_letters(limit: int = 100) -> list[DeadLetterMessage]:
+    """Просмотр сообщений без удаления из очереди"""
+    connection = await get_rabbitmq_connection()
+    async with connection:
+        channel = await connection.channel(publisher_confirms=True)
+        queue = await declare_dead_letter_queue(channel)
+        entries = []
+        await _scan_dead_letters(channel, queue, limit, lambda message: entries.append(_parse_message(message)))
+    return entries
+
+async def dead_letter_stats(limit: int = 10_000) -> DeadLetterStats:
+    """Агрегация сообщений по типу ошибки, в памяти хранятся только счётчики"""
+    connection = await get_rabbitmq_connection()
+    async with connection:
+        channel = await connection.channel(publisher_confirms=True)
+        queue = await declare_dead_letter_queue(channel)
+        by_error: Counter[str] = Counter()
+
+        def count(message: AbstractIncomingMessage) -> None:
+            by_error[_error_type(_parse_message(message))] += 1
+
+        await _scan_dead_letters(channel, queue, limit, count)
+    return DeadLetterStats(scanned=sum(by_error.values()), by_error=dict(by_error))
+
+async def replay_dead_letters(
+    limit: int | None = None,
+    batch_size: int | None = None,
+    rate: float | None = None
+) -> DeadLetterReplayResult:
+    """Возвращает сообщения в исходный обменник пачками с ограничением скорости"""
+    batch_size = batch_size or settings.DLQ_REPLAY_BATCH_SIZE
+    rate = rate or settings.DLQ_REPLAY_RATE
+    replayed = failed = scanned = 0
+
+    connection = await get_rabbitmq_connection()
+    async with connection:
+        # Без on_return_raises неразмещённое mandatory сообщение всё равно подтверждается
+        channel = await connection.channel(publisher_confirms=True, on_return_raises=True)
+        queue = await declare_dead_letter_queue(channel)
+        exchanges: dict[str, AbstractExchange] = {"": channel.default_exchange}
+
+        # Сообщения, снова попавшие в DLQ во время повтора, в этот проход не входят
+        total = queue.declaration_result.message_count
+        if limit is not None:
+            total = min(total, limit)
+
+        while scanned < total:
+            started = time.monotonic()
+            size = min(batch_size, total - scanned)
+            batch = []
+            for _ in range(size):
+                message = await queue.get(fail=False)
+                if message is None:
+                    break
+                batch.append(message)
+            if not batch:
+                break
+
+            await _reset_failed_tasks(batch)
+            routes = [_origin(message) for message in batch]
+            for name, _ in routes:
+                if name not in exchanges:
+                    exchanges[name] = await channel.get_exchange(name, ensure=False)
+            results = await asyncio.gather(*(
+                exchanges[name].publish(
+                    _copy_message(message, {
+                        **{
+                            k: v for k, v in (message.headers or {}).items()
+                            if k not in _DEAD_LETTER_HEADERS
+                        },
+                        "retry_count": (message.headers or {}).get("retry_count", 0) + 1
+                    }),
+                    routing_key=routing_key,
+                    mandatory=True
+                )
+                for message, (name, routing_key) in zip(batch, routes)
+            ), return_exceptions=True)
+
+            # Неразмещённые сообщения остаются в DLQ копией в хвосте, как при просмотре
+            unrouted = []
+            for message, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    logger.error("Dead letter replay failed: %s", result, extra={"message_id": message.message_id})
+                    unrouted.append(message)
+            await asyncio.gather(*(
+                channel.default_exchange.publish(
+                    _copy_message(message, message.headers or {}),
+                    routing_key=queue.name
+                )
+                for message in unrouted
+            ))
+            # Удаляем из DLQ только после подтверждения публикации
+            await asyncio.gather(*(message.ack() for message in batch))
+            scanned += len(batch)
+            failed += len(unrouted)
+            replayed += len(batch) - len(unrouted)
+            logger.info("Dead letters replayed", extra={"replayed": replayed, "failed": failed})
+
+            if len(batch) < size:
+                break
+            delay = len(batch) / rate - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    return DeadLetterReplayResult(replayed=replayed, failed=failed)
+
+async def purge_dead_letters() -> int:
+    """Очистка очереди отклонённых сообщений"""
+    connection = await get_rabbitmq_connection()
+    async with connection:
+        channel = await connection.channel()
+        queue = await declare_dead_letter_queue(channel)
+        result = await queue.purge()
+    logger.warning("Dead letter queue purged", extra={"purged": result.message_count})
+    return result.message_count
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Управление очередью отклонённых сообщений")
+    commands = parser.add_subparsers(dest="command", required=True)
+    peek = commands.add_parser("peek")
+    peek.add_argument("--limit", type=int, default=20)
+    stats = commands.add_parser("stats")
+    stats.add_argument("--limit", type=int, default=10_000)
+    replay = commands.add_parser("replay")
+    replay.add_argument("--limit", type=int)
+    replay.add_argument("--batch-size", type=int)
+    replay.add_argument("--rate", type=float)
+    commands.add_parser("purge")
+    args = parser.parse_args()
+
+    if args.command == "peek":
+        for entry in await peek_dead_letters(args.limit):
+            print(entry.model_dump_json())
+    elif args.command == "stats":
+        print((await dead_letter_stats(args.limit)).model_dump_json(indent=2))
+    elif args.command == "replay":
+        result = await replay_dead_letters(args.limit, args.batch_size, args.rate)
+        print(result.model_dump_json())
+    elif args.command == "purge":
+        print(await purge_dead_letters())
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,9 +1,12 @@
+import asyncio
 import json
 import aio_pika
-from aio_pika.abc import AbstractChannel
+from aio_pika.abc import AbstractChannel, AbstractExchange
+from app.message.sharding import declare_shard_topology
 from app.utils.config import settings
 from app.utils.logging import logger
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from app.utils.tracing import inject, traced
+from tenacity import AsyncRetrying, retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from aio_pika.exceptions import AMQPConnectionError
 
 async def get_rabbitmq_connection():
@@ -28,13 +31,41 @@ async def get_rabbitmq_channel() -> AbstractChannel:
     )
     return channel
 
+def _build_message(task_id: int, message_id: str | None = None) -> aio_pika.Message:
+    """Сообщение с идентификатором задачи"""
+    return aio_pika.Message(
+        body=json.dumps({"task_id": task_id}).encode(),
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        message_id=message_id,
+        headers=inject({
+            "retry_count": 0,
+            "service": "task-manager",
+            "version": "1.0"
+        })
+    )
+
+def _route(
+    channel: AbstractChannel,
+    shard_exchange: AbstractExchange | None,
+    partition_key: str | None
+) -> tuple[AbstractExchange, str]:
+    """Задачи с ключом партиции идут через consistent-hash обменник в шарды"""
+    if partition_key and shard_exchange:
+        return shard_exchange, partition_key
+    return channel.default_exchange, settings.RABBITMQ_TASK_QUEUE
+
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=1, max=10),
     retry=retry_if_exception_type(AMQPConnectionError)
 )
-async def publish_task(task_id: int) -> None:
-    """Публикует задачу в очередь"""
+@traced("amqp.publish")
+async def publish_task(
+    task_id: int,
+    partition_key: str | None = None,
+    idempotency_key: str | None = None
+) -> None:
+    """Публикует задачу в очередь, ключ идемпотентности становится message_id"""
     try:
         connection = await get_rabbitmq_connection()
         async with connection:
@@ -44,27 +75,147 @@ async def publish_task(task_id: int) -> None:
                 durable=True,
                 arguments={
                     "x-queue-type": "quorum",
-                    "x-dead-letter-exchange": "dead_letter_exchange"
+                    "x-dead-letter-exchange": settings.RABBITMQ_DEAD_LETTER_EXCHANGE
                 }
             )
             
-            message = aio_pika.Message(
-                body=json.dumps({"task_id": task_id}).encode(),
-                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-                headers={
-                    "retry_count": 0,
-                    "service": "task-manager",
-                    "version": "1.0"
-                }
-            )
+            shard_exchange = None
+            if partition_key and settings.RABBITMQ_SHARD_COUNT:
+                shard_exchange = await declare_shard_topology(channel)
+            exchange, routing_key = _route(channel, shard_exchange, partition_key)
             
-            await channel.default_exchange.publish(
+            message = _build_message(task_id, idempotency_key)
+            
+            await exchange.publish(
                 message,
-                routing_key=settings.RABBITMQ_TASK_QUEUE,
+                routing_key=routing_key,
                 mandatory=True
             )
-            logger.info("Task published", extra={"task_id": task_id})
+            logger.info("Task published", extra={"task_id": task_id, "partition_key": partition_key})
+
+    except AMQPConnectionError as e:
+        logger.error("Connection failed after retries: %s", e)
+        raise
+
+async def _close_quietly(connection) -> None:
+    if connection is None:
+        return
+    try:
+        await connection.close()
+    except Exception as e:
+        logger.warning("Connection close failed: %s", e)
+
+async def _open_publish_channel(need_shards: bool):
+    """Соединение и канал с подтверждениями для пакетной публикации"""
+    connection = await get_rabbitmq_connection()
+    channel = await connection.channel(publisher_confirms=True)
+    await channel.declare_queue(
+        settings.RABBITMQ_TASK_QUEUE,
+        durable=True,
+        arguments={
+            "x-queue-type": "quorum",
+            "x-dead-letter-exchange": settings.RABBITMQ_DEAD_LETTER_EXCHANGE
+        }
+    )
+    shard_exchange = await declare_shard_topology(channel) if need_shards else None
+    return connection, channel, shard_exchange
+
+@traced("amqp.publish_batch")
+async def publish_tasks(
+    tasks: list[tuple[int, str | None]],
+    idempotency_key: str | None = None
+) -> int:
+    """Публикует задачи пачками с подтверждениями, возвращает число опубликованных"""
+    if not tasks:
+        return 0
+
+    # Порядок id сохраняет порядок задач внутри одного ключа партиции
+    tasks = sorted(tasks)
+
+    batch_size = settings.TASK_BULK_PUBLISH_BATCH_SIZE
+    need_shards = bool(settings.RABBITMQ_SHARD_COUNT and any(key for _, key in tasks))
+    published = 0
+    connection = channel = shard_exchange = None
+    try:
+        while published < len(tasks):
+            batch = tasks[published:published + batch_size]
+            try:
+                async for attempt in AsyncRetrying(
+                    stop=stop_after_attempt(3),
+                    wait=wait_exponential(multiplier=1, min=1, max=10),
+                    retry=retry_if_exception_type(AMQPConnectionError),
+                    reraise=True
+                ):
+                    with attempt:
+                        if connection is None:
+                            connection, channel, shard_exchange = await _open_publish_channel(need_shards)
+                        try:
+                            routes = [_route(channel, shard_exchange, key) for _, key in batch]
+                            # Подтверждения внутри пачки ожидаются параллельно
+                            await asyncio.gather(*(
+                                exchange.publish(
+                                    _build_message(
+                                        task_id,
+                                        f"{idempotency_key}:{task_id}" if idempotency_key else None
+                                    ),
+                                    routing_key=routing_key,
+                                    mandatory=True
+                                )
+                                for (task_id, _), (exchange, routing_key) in zip(batch, routes)
+                            ))
+                        except AMQPConnectionError:
+                            # Пачка повторяется целиком на новом соединении
+                            await _close_quietly(connection)
+                            connection = None
+                            raise
+            except AMQPConnectionError as e:
+                logger.error(
+                    "Bulk publish stopped after retries: %s",
+                    e,
+                    extra={"published": published, "total": len(tasks)}
+                )
+                break
+
+            published += len(batch)
+            logger.info(
+                "Bulk publish progress",
+                extra={"published": published, "total": len(tasks)}
+            )
+    finally:
+        await _close_quietly(connection)
+
+    return published
+
+async def declare_control_exchange(channel: AbstractChannel) -> AbstractExchange:
+    """Широковещательный обменник управляющих команд воркерам"""
+    return await channel.declare_exchange(
+        settings.RABBITMQ_CONTROL_EXCHANGE,
+        aio_pika.ExchangeType.FANOUT,
+        durable=True
+    )
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=1, max=10),
+    retry=retry_if_exception_type(AMQPConnectionError)
+)
+@traced("amqp.publish_cancel")
+async def publish_cancel(task_id: int) -> None:
+    """Рассылает всем воркерам команду отмены задачи"""
+    try:
+        connection = await get_rabbitmq_connection()
+        async with connection:
+            channel = await connection.channel()
+            exchange = await declare_control_exchange(channel)
+            await exchange.publish(
+                aio_pika.Message(
+                    body=json.dumps({"action": "cancel", "task_id": task_id}).encode(),
+                    headers=inject({"service": "task-manager", "version": "1.0"})
+                ),
+                routing_key=""
+            )
+            logger.info("Task cancel requested", extra={"task_id": task_id})
 
     except AMQPConnectionError as e:
         logger.error("Connection failed after retries: %s", e)
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,47 @@
+import os
+import socket
+import zlib
+import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractExchange, AbstractQueue
+from app.utils.config import settings
+
+
+def worker_id() -> str:
+    """Идентификатор реплики воркера"""
+    return settings.WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+def shard_queue_name(shard: int) -> str:
+    return f"{settings.RABBITMQ_TASK_QUEUE}.shard.{shard}"
+
+def consumer_priority(worker: str, shard: int) -> int:
+    """Приоритет реплики для шарда (rendezvous hashing), активна реплика с наибольшим"""
+    return zlib.crc32(f"{worker}:{shard}".encode()) % 1_000_000
+
+async def declare_shard_exchange(channel: AbstractChannel) -> AbstractExchange:
+    return await channel.declare_exchange(
+        settings.RABBITMQ_SHARD_EXCHANGE,
+        aio_pika.ExchangeType.X_CONSISTENT_HASH,
+        durable=True
+    )
+
+async def declare_shard_queue(channel: AbstractChannel, shard: int) -> AbstractQueue:
+    """Объявляет очередь шарда и привязывает её к consistent-hash обменнику"""
+    exchange = await declare_shard_exchange(channel)
+    queue = await channel.declare_queue(
+        shard_queue_name(shard),
+        durable=True,
+        arguments={
+            "x-queue-type": "quorum",
+            "x-single-active-consumer": True,
+            "x-dead-letter-exchange": settings.RABBITMQ_DEAD_LETTER_EXCHANGE
+        }
+    )
+    # Для consistent-hash обменника ключ привязки - вес шарда
+    await queue.bind(exchange, routing_key="1")
+    return queue
+
+async def declare_shard_topology(channel: AbstractChannel) -> AbstractExchange:
+    """Объявляет обменник и все очереди шардов"""
+    for shard in range(settings.RABBITMQ_SHARD_COUNT):
+        await declare_shard_queue(channel, shard)
+    return await declare_shard_exchange(channel)
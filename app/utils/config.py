@@ -8,6 +8,16 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
     DATABASE_URL: PostgresDsn | None = None
+    DATABASE_REPLICA_URLS: list[PostgresDsn] = []
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800           # Пересоздание соединений старше N секунд
+    DB_POOL_PRE_PING: bool = True
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100 # 0 - отключить (нужно за pgbouncer в режиме transaction)
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_READ_STICKINESS: float = 5.0       # Сколько секунд после записи задача читается с primary (в пределах процесса)
 
     @model_validator(mode='before')
     def assemble_db_connection(cls, values: dict):
@@ -27,6 +37,13 @@ class Settings(BaseSettings):
     RABBITMQ_USER: str
     RABBITMQ_PASSWORD: str
     RABBITMQ_TASK_QUEUE: str = "task_queue"
+    RABBITMQ_DEAD_LETTER_EXCHANGE: str = "dead_letter_exchange"
+    RABBITMQ_DEAD_LETTER_QUEUE: str = "dead_letter_queue"
+    RABBITMQ_SHARD_EXCHANGE: str = "task_shards"
+    RABBITMQ_CONTROL_EXCHANGE: str = "task_control"
+    RABBITMQ_SHARD_COUNT: int = 4         # Число шардов для задач с partition_key (0 - отключено)
+    DLQ_REPLAY_BATCH_SIZE: int = 100      # Размер пачки при повторной отправке из DLQ
+    DLQ_REPLAY_RATE: float = 200.0        # Ограничение скорости повторной отправки, сообщений/с
 
     #ВОРКЕР
     TASK_MIN_PROCESS_TIME: float = 5.0    # Минимальное время обработки в секундах
@@ -34,12 +51,28 @@ class Settings(BaseSettings):
     TASK_ERROR_PROBABILITY: float = 0.2   # Вероятность ошибки
     TASK_MAX_RETRIES: int = 3             # Максимальное количество попыток повторной обр-ки
     TASK_RETRY_DELAY: int = 40            # Задержка между повторами в секундах
+    TASK_TIMEOUT: float = 60.0            # Ограничение времени выполнения задачи в секундах
     WORKER_MAX_CONCURRENT_TASKS: int = 10 # Максимальное число параллельных задач
     WORKER_PREFETCH_COUNT: int = 5        # Количество предзагружаемых сообщений
+    TASK_BULK_PUBLISH_BATCH_SIZE: int = 500 # Размер пачки при массовой публикации
+    WORKER_ID: str | None = None          # Идентификатор реплики (по умолчанию hostname-pid)
+    WORKER_CANCEL_REQUEST_TTL: float = 60.0 # Сколько помнить команду отмены задачи, ещё не запущенной на воркере
+
+    #ИДЕМПОТЕНТНОСТЬ
+    IDEMPOTENCY_KEY_TTL: int = 86400      # Время жизни ключа Idempotency-Key в секундах
 
     #ЛОГЕР
     LOG_LEVEL: str = "INFO"
 
+    #ТРАССИРОВКА
+    TRACE_SAMPLE_RATE: float = 0.01       # Доля трасс, которые записываются (0 - отключено)
+    TRACE_EXPORTER: str = "jsonl"         # jsonl или otlp
+    TRACE_EXPORT_PATH: str = "traces.jsonl"
+    TRACE_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACE_EXPORT_BATCH_SIZE: int = 512    # Размер пачки экспорта
+    TRACE_EXPORT_INTERVAL: float = 5.0    # Период экспорта в секундах
+    TRACE_EXPORT_MAX_QUEUE: int = 10000   # Ограничение буфера, старые интервалы вытесняются
+
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -0,0 +1,228 @@
+import asyncio
+import functools
+import json
+import random
+import time
+import urllib.request
+from collections import deque
+from collections.abc import Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, NamedTuple, Optional
+from app.utils.config import settings
+from app.utils.logging import logger
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+class Span:
+    """Интервал выполнения операции"""
+    __slots__ = ("name", "context", "parent_id", "attributes", "start_ns", "end_ns", "status")
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Optional[str], attributes: dict):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+
+    def set_attribute(self, key: str, value) -> None:
+        if self.context.sampled:
+            self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+@contextmanager
+def start_span(name: str, parent: Optional[SpanContext] = None, **attributes):
+    """Открывает дочерний интервал текущего (или переданного) контекста.
+
+    Решение о сэмплировании принимается один раз в корне трассы и
+    наследуется, поэтому несэмплированные интервалы почти ничего не стоят.
+    """
+    if parent is None:
+        current = _current_span.get()
+        parent = current.context if current else None
+    if parent:
+        context = SpanContext(parent.trace_id, _new_id(64), parent.sampled)
+    else:
+        context = SpanContext(_new_id(128), _new_id(64), random.random() < settings.TRACE_SAMPLE_RATE)
+
+    span = Span(name, context, parent.span_id if parent else None, attributes if context.sampled else {})
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.set_attribute("error", repr(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        if context.sampled:
+            span.end_ns = time.time_ns()
+            exporter.export(span)
+
+def traced(name: Optional[str] = None):
+    """Оборачивает корутину в интервал"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with start_span(span_name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def inject(headers: dict) -> dict:
+    """Добавляет контекст трассы в заголовки AMQP сообщения (формат W3C traceparent)"""
+    span = _current_span.get()
+    if span:
+        flags = "01" if span.context.sampled else "00"
+        headers["traceparent"] = f"00-{span.context.trace_id}-{span.context.span_id}-{flags}"
+    return headers
+
+def extract(headers) -> Optional[SpanContext]:
+    """Читает контекст трассы из заголовков сообщения"""
+    if not isinstance(headers, Mapping):
+        return None
+    traceparent = headers.get("traceparent")
+    if isinstance(traceparent, bytes):
+        traceparent = traceparent.decode()
+    if not isinstance(traceparent, str):
+        return None
+    parts = traceparent.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return SpanContext(parts[1], parts[2], parts[3] == "01")
+
+
+def write_jsonl(path: str) -> Callable[[list[dict]], None]:
+    def write(batch: list[dict]) -> None:
+        with open(path, "a", encoding="utf-8") as file:
+            file.writelines(json.dumps(span, default=str) + "\n" for span in batch)
+    return write
+
+def post_otlp(endpoint: str) -> Callable[[list[dict]], None]:
+    """Отправка пачки в OTLP/HTTP JSON совместимый приёмник"""
+    def post(batch: list[dict]) -> None:
+        spans = [
+            {
+                "traceId": span["trace_id"],
+                "spanId": span["span_id"],
+                "parentSpanId": span["parent_id"] or "",
+                "name": span["name"],
+                "startTimeUnixNano": str(span["start_ns"]),
+                "endTimeUnixNano": str(span["end_ns"]),
+                "status": {"code": 2 if span["status"] == "error" else 1},
+                "attributes": [
+                    {"key": key, "value": {"stringValue": str(value)}}
+                    for key, value in span["attributes"].items()
+                ],
+            }
+            for span in batch
+        ]
+        payload = {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [{"key": "service.name", "value": {"stringValue": "task-manager"}}]
+                },
+                "scopeSpans": [{"scope": {"name": "app.utils.tracing"}, "spans": spans}],
+            }]
+        }
+        request = urllib.request.Request(
+            endpoint,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=5):
+            pass
+    return post
+
+class BatchSpanExporter:
+    """Фоновый экспорт интервалов пачками.
+
+    export() не блокирует: интервал кладётся в ограниченный буфер (при
+    переполнении вытесняются самые старые), а запись идёт в отдельном потоке.
+    """
+
+    def __init__(self, writer: Callable[[list[dict]], None], batch_size: int, interval: float, max_queue: int):
+        self._writer = writer
+        self._batch_size = batch_size
+        self._interval = interval
+        self._queue: deque[dict] = deque(maxlen=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def export(self, span: Span) -> None:
+        self._queue.append(span.to_dict())
+        if self._task is None or self._task.done():
+            try:
+                self._task = asyncio.get_running_loop().create_task(self._run())
+            except RuntimeError:
+                return
+        if len(self._queue) >= self._batch_size and self._wakeup:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self._batch_size, len(self._queue)))]
+            try:
+                await asyncio.to_thread(self._writer, batch)
+            except Exception as e:
+                logger.warning("Span export failed: %s", e)
+                return
+
+    async def shutdown(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+def _create_exporter() -> BatchSpanExporter:
+    if settings.TRACE_EXPORTER == "otlp":
+        writer = post_otlp(settings.TRACE_OTLP_ENDPOINT)
+    else:
+        writer = write_jsonl(settings.TRACE_EXPORT_PATH)
+    return BatchSpanExporter(
+        writer,
+        batch_size=settings.TRACE_EXPORT_BATCH_SIZE,
+        interval=settings.TRACE_EXPORT_INTERVAL,
+        max_queue=settings.TRACE_EXPORT_MAX_QUEUE
+    )
+
+exporter = _create_exporter()
@@ -1,31 +1,23 @@
 import asyncio
 import random
+import time
 from typing import Optional
+from app.core.service.group import TaskGroupService
 from app.core.service.task import TaskService
-from app.db import StatusTask, Task, get_session
+from app.db import StatusTask, Task, async_session
+from app.message.producer import publish_task
 from app.utils.config import settings
 from app.utils.logging import logger
+from app.utils.tracing import exporter, traced
 from tenacity import retry, stop_after_attempt, retry_if_exception_type
 from asyncio import CancelledError
-from fastapi import HTTPException
 
-async def _update_status(
-    service: TaskService,
-    task_id: int,
-    status: StatusTask,
-    message: str
-) -> None:
-    """Обновление статуса задачи"""
-    logger.info(
-        message,
-        extra={
-            "task_id": task_id,
-            "status": status.value,
-            "type": "STATUS_UPDATE"
-        }
-    )
-    await service.update_task_status(task_id, status)
+# Выполняемые обработчики по id задачи - для отмены по команде из control exchange
+_running_handlers: dict[int, asyncio.Task] = {}
+# Команды отмены для задач, обработчик которых ещё не запущен: id -> срок хранения
+_cancel_requests: dict[int, float] = {}
 
+@traced("worker.handler")
 async def _simulate_processing(task_id: int) -> float:
     """Имитация обработки задачи"""
     processing_time = random.uniform(
@@ -43,6 +35,33 @@ async def _simulate_processing(task_id: int) -> float:
     await asyncio.sleep(processing_time)
     return processing_time
 
+async def _run_handler(task_id: int, timeout: float) -> float:
+    """Запуск обработчика отдельной задачей с ограничением времени"""
+    handler = asyncio.create_task(_simulate_processing(task_id))
+    _running_handlers[task_id] = handler
+    # Команда могла прийти между захватом задачи и регистрацией обработчика
+    if _cancel_requests.pop(task_id, 0) > time.monotonic():
+        handler.cancel()
+    try:
+        async with asyncio.timeout(timeout):
+            return await handler
+    finally:
+        _running_handlers.pop(task_id, None)
+
+def cancel_running_task(task_id: int) -> bool:
+    """Отмена выполняемого обработчика, если задача принадлежит этому воркеру"""
+    # Обработчик ещё не запущен - команда запоминается на WORKER_CANCEL_REQUEST_TTL
+    handler = _running_handlers.get(task_id)
+    if handler is None:
+        now = time.monotonic()
+        for stale in [key for key, expires in _cancel_requests.items() if expires < now]:
+            del _cancel_requests[stale]
+        _cancel_requests[task_id] = now + settings.WORKER_CANCEL_REQUEST_TTL
+        return False
+    logger.info("Cancelling running task", extra={"task_id": task_id})
+    handler.cancel()
+    return True
+
 async def _should_fail() -> bool:
     """Определение вероятности ошибки"""
     return random.random() < settings.TASK_ERROR_PROBABILITY
@@ -115,12 +134,65 @@ async def _handle_processing_error(
             error_message=error_msg
         )
 
+async def _handle_timeout(
+    service: TaskService,
+    task_id: int,
+    timeout: float
+) -> None:
+    """Обработка превышения времени выполнения"""
+    error_msg = f"Timed out after {timeout:.2f}s"
+    logger.warning(
+        "Task processing timed out",
+        extra={
+            "task_id": task_id,
+            "error": error_msg,
+            "type": "PROCESS_TIMEOUT"
+        }
+    )
+    await service.update_task_status(
+        task_id,
+        StatusTask.ERROR,
+        error_message=error_msg
+    )
+
+async def _handle_cancel_request(service: TaskService, task_id: int) -> None:
+    """Отмена задачи по запросу"""
+    logger.warning("Processing cancelled by request", extra={"task_id": task_id})
+    await service.update_task_status(
+        task_id,
+        StatusTask.CANCELLED,
+        error_message="Cancelled by request"
+    )
+
+async def _finish_group(service: TaskService, group_id: Optional[int]) -> None:
+    """Завершение группы и постановка задачи обратного вызова"""
+    if not group_id:
+        return
+    try:
+        callbacks = await TaskGroupService(service.session).finish_groups([group_id])
+        for callback in callbacks:
+            await publish_task(callback.id, callback.partition_key)
+            logger.info(
+                "Task group callback enqueued",
+                extra={"group_id": group_id, "task_id": callback.id}
+            )
+    except Exception as e:
+        # Статус задачи уже зафиксирован и не меняется: неопубликованный
+        # обратный вызов остаётся new_task до /bulk/requeue
+        logger.error(
+            "Task group finish failed: %s",
+            e,
+            extra={"group_id": group_id},
+            exc_info=True
+        )
+
 async def _handle_cancell(service: TaskService, task_id: int):
     """Отмена задачи"""
     logger.warning("Processing cancelled", extra={"task_id": task_id})
+    # Остановка воркера - не ошибка задачи: повторная доставка снова её захватит
     await service.update_task_status(
         task_id,
-        StatusTask.ERROR,
+        StatusTask.NEW_TASK,
         error_message="Processing cancelled"
     )
 
@@ -140,50 +212,66 @@ def log_retry_attempt(retry_state):
     retry=retry_if_exception_type((Exception,)),
     before_sleep=log_retry_attempt
 )
+@traced("worker.process_task")
 async def process_task(task_id: int) -> None:
     """Обработка задачи"""
-    try:
-        async with get_session() as session:
-            service = TaskService(session)
-            try:
-                task = await service.get_task(task_id)
-            except HTTPException as e:
-                if e.status_code == 404:
-                    logger.error("Task not found, skipping", extra={"task_id": task_id})
-                    return
-                raise
-
-            # Проверяем уже обработанные
-            if task.status not in [StatusTask.NEW_TASK, StatusTask.ERROR]:
+    task = None
+    async with async_session() as session:
+        service = TaskService(session)
+        try:
+            # Условный захват: отменённую, выполняемую или завершённую задачу пропускаем
+            task = await service.claim_task(task_id)
+            if task is None:
                 logger.warning(
-                    "Task in non-processable status",
-                    extra={"task_id": task_id, "status": task.status.value}
+                    "Task not found or in non-processable status, skipping",
+                    extra={"task_id": task_id}
                 )
                 return
-
-            await _update_status(service, task_id, StatusTask.PROCESS_TASK, "Processing started")
+            logger.info(
+                "Processing started",
+                extra={
+                    "task_id": task_id,
+                    "status": StatusTask.PROCESS_TASK.value,
+                    "type": "STATUS_UPDATE"
+                }
+            )
             
+            timeout = task.timeout or settings.TASK_TIMEOUT
             try:
-                processing_time = await _simulate_processing(task_id)
+                processing_time = await _run_handler(task_id, timeout)
+            except TimeoutError:
+                await _handle_timeout(service, task_id, timeout)
             except CancelledError:
-                await _handle_cancell(service, task_id)
-                raise
-
-            if await _should_fail():
-                await _handle_error(service, task_id, processing_time)
+                # Отменена сама обработка - остановка воркера, иначе - команда отмены задачи
+                if asyncio.current_task().cancelling():
+                    await _handle_cancell(service, task_id)
+                    raise
+                await _handle_cancel_request(service, task_id)
             else:
-                await _handle_success(service, task_id, processing_time)
+                if await _should_fail():
+                    await _handle_error(service, task_id, processing_time)
+                else:
+                    await _handle_success(service, task_id, processing_time)
 
-    except CancelledError:
-        logger.warning("Task processing cancelled", extra={"task_id": task_id})
-        raise
-    except Exception as e:
-        await _handle_processing_error(service, task, e)
+        except CancelledError:
+            logger.warning("Task processing cancelled", extra={"task_id": task_id})
+            raise
+        except Exception as e:
+            # Транзакция после сбоя могла остаться в ошибочном состоянии
+            await session.rollback()
+            await _handle_processing_error(service, task, e)
+
+        # Группа завершается вне обработки ошибок задачи: её итоговый статус уже зафиксирован
+        if task:
+            await _finish_group(service, task.group_id)
 
 
 async def main():
     from app.message.consumer import consume_tasks
-    await consume_tasks()
+    try:
+        await consume_tasks()
+    finally:
+        await exporter.shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,27 @@
+from unittest.mock import MagicMock, patch
+from sqlalchemy import select, update
+
+from app.db import Task, engine, is_recently_written, mark_written, pool_stats
+from app.db.config import RoutingSession
+
+def test_select_routed_to_replica_only_when_requested():
+    replica = MagicMock()
+    session = RoutingSession()
+    with patch('app.db.config.replica_engines', [replica]):
+        assert session.get_bind(clause=select(Task)) is engine.sync_engine
+
+        session.info["use_replica"] = True
+        assert session.get_bind(clause=select(Task)) is replica.sync_engine
+        assert session.get_bind(clause=update(Task).values(title="x")) is engine.sync_engine
+
+def test_recent_write_is_sticky():
+    mark_written(1)
+
+    assert is_recently_written(1)
+    assert not is_recently_written(2)
+
+def test_pool_stats_reports_primary():
+    stats = pool_stats()
+
+    assert stats[0]["engine"] == "primary"
+    assert stats[0]["checked_out"] == 0
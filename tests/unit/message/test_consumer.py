@@ -35,4 +35,40 @@ async def test_missing_task_id():
     with patch('app.message.consumer.logger') as mock_logger:
         await process_single_message(mock_message)
         
-        mock_logger.warning.assert_called_with("Invalid message format: missing task_id")
\ No newline at end of file
+        mock_logger.warning.assert_called_with("Invalid message format: missing task_id")
+
+@pytest.mark.asyncio
+async def test_redelivered_message_deduplicated_by_claim():
+    mock_message = AsyncMock(spec=AbstractIncomingMessage)
+    mock_message.body = b'{"task_id": 123}'
+    mock_message.headers = {}
+    mock_message.message_id = "key-1"
+    mock_message.redelivered = True
+
+    # Кэша в процессе нет: повтор отсеивает claim_task, который вернёт None
+    with patch('app.worker.process.async_session'), \
+         patch('app.worker.process.TaskService') as mock_service, \
+         patch('app.worker.process._run_handler') as mock_run:
+        mock_service.return_value.claim_task = AsyncMock(return_value=None)
+
+        await process_single_message(mock_message)
+
+        mock_service.return_value.claim_task.assert_awaited_once_with(123)
+        mock_run.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_failed_message_dead_lettered_with_error_type():
+    mock_message = AsyncMock(spec=AbstractIncomingMessage)
+    mock_message.body = b'{"task_id": 123}'
+    mock_message.headers = {}
+    mock_message.message_id = None
+    mock_message.redelivered = False
+    dead_letters = AsyncMock()
+
+    with patch('app.message.consumer.process_task', side_effect=ValueError("boom")), \
+         patch('app.message.consumer.dead_letter_message') as mock_dead_letter:
+        await process_single_message(mock_message, dead_letters)
+
+        mock_dead_letter.assert_awaited_once()
+        assert isinstance(mock_dead_letter.call_args[0][2], ValueError)
+        mock_message.reject.assert_not_awaited()
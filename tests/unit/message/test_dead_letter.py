@@ -0,0 +1,182 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from aio_pika.exceptions import DeliveryError
+
+from app.message.dead_letter import dead_letter_message, dead_letter_stats, peek_dead_letters, replay_dead_letters
+
+def _dead_message(task_id: int, reason: str = "rejected", error_type: str | None = None):
+    message = MagicMock()
+    message.body = f'{{"task_id": {task_id}}}'.encode()
+    message.headers = {
+        "retry_count": 0,
+        "x-death": [{"reason": reason, "queue": "task_queue", "count": 1}]
+    }
+    if error_type:
+        message.headers["x-error-type"] = error_type
+    for prop in ("content_type", "content_encoding", "priority", "correlation_id",
+                 "reply_to", "timestamp", "type", "app_id", "exchange", "routing_key"):
+        setattr(message, prop, None)
+    message.message_id = f"key-{task_id}"
+    message.ack = AsyncMock()
+    return message
+
+def _mock_queue(messages):
+    queue = AsyncMock()
+    queue.name = "dead_letter_queue"
+    queue.declaration_result.message_count = len(messages)
+    queue.get.side_effect = [*messages, None]
+    return queue
+
+@pytest.fixture(autouse=True)
+def task_service():
+    with patch('app.message.dead_letter.async_session'), \
+         patch('app.message.dead_letter.TaskService') as mock_service:
+        mock_service.return_value.retry_failed_tasks = AsyncMock(return_value=[])
+        yield mock_service.return_value
+
+@pytest.mark.asyncio
+async def test_peek_parses_x_death():
+    queue = _mock_queue([_dead_message(1), _dead_message(2, "expired")])
+    with patch('app.message.dead_letter.get_rabbitmq_connection'), \
+         patch('app.message.dead_letter.declare_dead_letter_queue', return_value=queue):
+        entries = await peek_dead_letters(limit=10)
+
+    assert [entry.task_id for entry in entries] == [1, 2]
+    assert entries[1].reason == "expired"
+    assert entries[0].queue == "task_queue"
+    assert entries[0].message_id == "key-1"
+
+@pytest.mark.asyncio
+async def test_peek_returns_copies_instead_of_requeue():
+    messages = [_dead_message(1), _dead_message(2)]
+    queue = _mock_queue(messages)
+    with patch('app.message.dead_letter.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.dead_letter.declare_dead_letter_queue', return_value=queue):
+        mock_channel = AsyncMock()
+        mock_conn.return_value.channel.return_value = mock_channel
+
+        await peek_dead_letters(limit=10)
+
+    # Копия в хвост DLQ не увеличивает счётчик доставок, в отличие от возврата в очередь
+    assert mock_channel.default_exchange.publish.await_count == 2
+    assert mock_channel.default_exchange.publish.call_args.kwargs["routing_key"] == "dead_letter_queue"
+    for message in messages:
+        message.ack.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_stats_aggregates_by_error_type():
+    queue = _mock_queue([
+        _dead_message(1, "rejected", "TimeoutError"),
+        _dead_message(2, "rejected", "TimeoutError"),
+        _dead_message(3, "rejected", "ValueError"),
+        _dead_message(4, "expired")
+    ])
+    with patch('app.message.dead_letter.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.dead_letter.declare_dead_letter_queue', return_value=queue):
+        mock_conn.return_value.channel.return_value = AsyncMock()
+        stats = await dead_letter_stats()
+
+    assert stats.scanned == 4
+    assert stats.by_error == {"TimeoutError": 2, "ValueError": 1, "expired": 1}
+
+@pytest.mark.asyncio
+async def test_dead_letter_message_sets_error_type():
+    message = _dead_message(1)
+    message.routing_key = "task_queue"
+    exchange = AsyncMock()
+
+    await dead_letter_message(exchange, message, TimeoutError("too slow"))
+
+    republished = exchange.publish.call_args[0][0]
+    assert republished.headers["x-error-type"] == "TimeoutError"
+    assert republished.message_id == "key-1"
+    message.ack.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_replay_acks_after_publish():
+    messages = [_dead_message(1), _dead_message(2)]
+    queue = _mock_queue(messages)
+    with patch('app.message.dead_letter.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.dead_letter.declare_dead_letter_queue', return_value=queue):
+        mock_channel = AsyncMock()
+        mock_conn.return_value.channel.return_value = mock_channel
+
+        result = await replay_dead_letters(batch_size=10, rate=1000)
+
+    assert result.replayed == 2
+    assert mock_channel.default_exchange.publish.await_count == 2
+    for message in messages:
+        message.ack.assert_awaited_once()
+    republished = mock_channel.default_exchange.publish.call_args[0][0]
+    assert "x-death" not in republished.headers
+    assert republished.headers["retry_count"] == 1
+    assert republished.message_id == "key-2"
+
+@pytest.mark.asyncio
+async def test_replay_resets_failed_tasks_before_publish(task_service):
+    queue = _mock_queue([_dead_message(1), _dead_message(2)])
+    with patch('app.message.dead_letter.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.dead_letter.declare_dead_letter_queue', return_value=queue):
+        mock_channel = AsyncMock()
+        mock_conn.return_value.channel.return_value = mock_channel
+        # К моменту публикации задачи уже должны быть в new_task
+        mock_channel.default_exchange.publish.side_effect = \
+            lambda *args, **kwargs: task_service.retry_failed_tasks.assert_awaited_once()
+
+        await replay_dead_letters(batch_size=10, rate=1000)
+
+    task_filter = task_service.retry_failed_tasks.call_args[0][0]
+    assert task_filter.ids == [1, 2]
+
+@pytest.mark.asyncio
+async def test_replay_routes_to_original_shard():
+    message = _dead_message(1)
+    message.headers["x-death"][0].update({
+        "queue": "task_queue.shard.3",
+        "exchange": "task_shards",
+        "routing-keys": ["tenant-a"]
+    })
+    queue = _mock_queue([message])
+    with patch('app.message.dead_letter.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.dead_letter.declare_dead_letter_queue', return_value=queue):
+        mock_channel = AsyncMock()
+        mock_conn.return_value.channel.return_value = mock_channel
+
+        await replay_dead_letters(batch_size=10, rate=1000)
+
+    mock_channel.get_exchange.assert_awaited_once_with("task_shards", ensure=False)
+    shard_exchange = mock_channel.get_exchange.return_value
+    assert shard_exchange.publish.call_args.kwargs["routing_key"] == "tenant-a"
+    mock_channel.default_exchange.publish.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_replay_keeps_unroutable_message_in_queue():
+    messages = [_dead_message(1), _dead_message(2)]
+    queue = _mock_queue(messages)
+    with patch('app.message.dead_letter.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.dead_letter.declare_dead_letter_queue', return_value=queue):
+        mock_channel = AsyncMock()
+        # Первая публикация возвращена брокером, затем копия уходит обратно в DLQ
+        mock_channel.default_exchange.publish.side_effect = [DeliveryError(None, None), None, None]
+        mock_conn.return_value.channel.return_value = mock_channel
+
+        result = await replay_dead_letters(batch_size=10, rate=1000)
+
+    assert result.replayed == 1
+    assert result.failed == 1
+    assert mock_conn.return_value.channel.call_args.kwargs["on_return_raises"] is True
+    assert mock_channel.default_exchange.publish.call_args.kwargs["routing_key"] == "dead_letter_queue"
+
+@pytest.mark.asyncio
+async def test_replay_limited_to_queue_length_at_start():
+    # Третье сообщение снова попало в DLQ уже во время повтора
+    queue = _mock_queue([_dead_message(1), _dead_message(2), _dead_message(3)])
+    queue.declaration_result.message_count = 2
+    with patch('app.message.dead_letter.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.dead_letter.declare_dead_letter_queue', return_value=queue):
+        mock_conn.return_value.channel.return_value = AsyncMock()
+
+        result = await replay_dead_letters(batch_size=10, rate=1000)
+
+    assert result.replayed == 2
+    assert queue.get.await_count == 2
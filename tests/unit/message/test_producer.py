@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import AsyncMock, patch
-from app.message.producer import publish_task
+from tenacity import wait_none
+from app.message.producer import publish_task, publish_tasks
 from aio_pika.exceptions import AMQPConnectionError
 
 @pytest.mark.asyncio
@@ -32,4 +33,77 @@ async def test_message_properties():
         
         message = mock_channel.default_exchange.publish.call_args[0][0]
         assert message.delivery_mode == 2
-        assert message.headers["service"] == "task-manager"
\ No newline at end of file
+        assert message.headers["service"] == "task-manager"
+
+@pytest.mark.asyncio
+async def test_publish_tasks_in_batches():
+    with patch('app.message.producer.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.producer.settings.TASK_BULK_PUBLISH_BATCH_SIZE', 2):
+        mock_channel = AsyncMock()
+        mock_conn.return_value.channel.return_value = mock_channel
+
+        published = await publish_tasks([(task_id, None) for task_id in range(1, 6)])
+
+        assert published == 5
+        assert mock_channel.default_exchange.publish.await_count == 5
+        mock_channel.declare_queue.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_publish_tasks_resumes_from_failed_batch():
+    with patch('app.message.producer.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.producer.wait_exponential', lambda **kwargs: wait_none()), \
+         patch('app.message.producer.settings.TASK_BULK_PUBLISH_BATCH_SIZE', 2):
+        mock_channel = AsyncMock()
+        mock_channel.default_exchange.publish.side_effect = [None, None, AMQPConnectionError(), None, None, None, None]
+        mock_conn.return_value.channel.return_value = mock_channel
+
+        published = await publish_tasks([(task_id, None) for task_id in range(1, 6)])
+
+        assert published == 5
+        # Повторяется только вторая пачка, первая не публикуется заново
+        assert mock_channel.default_exchange.publish.await_count == 7
+        assert mock_conn.await_count == 2
+
+@pytest.mark.asyncio
+async def test_publish_tasks_reports_partial_progress():
+    with patch('app.message.producer.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.producer.wait_exponential', lambda **kwargs: wait_none()), \
+         patch('app.message.producer.settings.TASK_BULK_PUBLISH_BATCH_SIZE', 2):
+        mock_channel = AsyncMock()
+        mock_channel.default_exchange.publish.side_effect = [None, None] + [AMQPConnectionError()] * 6
+        mock_conn.return_value.channel.return_value = mock_channel
+
+        published = await publish_tasks([(task_id, None) for task_id in range(1, 6)])
+
+        assert published == 2
+        assert mock_conn.await_count == 3
+
+@pytest.mark.asyncio
+async def test_publish_tasks_derives_message_ids_from_idempotency_key():
+    with patch('app.message.producer.get_rabbitmq_connection') as mock_conn:
+        mock_channel = AsyncMock()
+        mock_conn.return_value.channel.return_value = mock_channel
+
+        await publish_tasks([(1, None), (2, None)], idempotency_key="key-1")
+
+        message_ids = [call.args[0].message_id for call in mock_channel.default_exchange.publish.call_args_list]
+        assert message_ids == ["key-1:1", "key-1:2"]
+
+@pytest.mark.asyncio
+async def test_publish_tasks_empty():
+    with patch('app.message.producer.get_rabbitmq_connection') as mock_conn:
+        assert await publish_tasks([]) == 0
+        mock_conn.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_publish_task_with_partition_key_uses_shard_exchange():
+    with patch('app.message.producer.get_rabbitmq_connection') as mock_conn, \
+         patch('app.message.producer.declare_shard_topology') as mock_topology:
+        mock_channel = AsyncMock()
+        mock_conn.return_value.channel.return_value = mock_channel
+
+        await publish_task(123, partition_key="tenant-a")
+
+        mock_topology.return_value.publish.assert_awaited_once()
+        assert mock_topology.return_value.publish.call_args.kwargs["routing_key"] == "tenant-a"
+        mock_channel.default_exchange.publish.assert_not_awaited()
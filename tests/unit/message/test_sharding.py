@@ -0,0 +1,19 @@
+from collections import Counter
+
+from app.message.sharding import consumer_priority, shard_queue_name
+
+def test_consumer_priority_is_stable():
+    assert consumer_priority("worker-1", 0) == consumer_priority("worker-1", 0)
+    assert consumer_priority("worker-1", 0) != consumer_priority("worker-2", 0)
+
+def test_shards_spread_between_workers():
+    workers = [f"worker-{i}" for i in range(4)]
+    owners = Counter(
+        max(workers, key=lambda worker: consumer_priority(worker, shard))
+        for shard in range(64)
+    )
+
+    assert len(owners) == len(workers)
+
+def test_shard_queue_name():
+    assert shard_queue_name(3).endswith(".shard.3")
@@ -0,0 +1,121 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.core.schemas.group import TaskGroupCreate, TaskGroupRead
+from app.core.schemas.task import TaskCreate
+from app.core.service.group import TaskGroupService, apply_group_deltas
+from app.db import StatusTask, TaskGroup
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
+from fastapi import HTTPException
+
+@pytest.fixture
+def mock_session():
+    session = AsyncMock(spec=AsyncSession)
+    session.add = MagicMock()
+    return session
+
+def _compiled_sql(call):
+    return str(call.args[0].compile(compile_kwargs={"literal_binds": True}))
+
+@pytest.mark.asyncio
+async def test_apply_group_deltas_moves_counters(mock_session):
+    await apply_group_deltas(mock_session, [
+        (1, StatusTask.PROCESS_TASK, StatusTask.COMPLETED_TASK),
+        (1, StatusTask.PROCESS_TASK, StatusTask.COMPLETED_TASK),
+        (1, StatusTask.ERROR, StatusTask.PROCESS_TASK),
+    ])
+
+    mock_session.execute.assert_awaited_once()
+    sql = _compiled_sql(mock_session.execute.call_args)
+    assert "completed=(task_group.completed + 2)" in sql
+    assert "failed=(task_group.failed + -1)" in sql
+
+@pytest.mark.asyncio
+async def test_apply_group_deltas_skips_ungrouped(mock_session):
+    await apply_group_deltas(mock_session, [
+        (None, StatusTask.PROCESS_TASK, StatusTask.COMPLETED_TASK),
+        (2, StatusTask.NEW_TASK, StatusTask.PROCESS_TASK),
+    ])
+
+    mock_session.execute.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_finish_groups_passes_callback_timeout(mock_session):
+    row = MagicMock(
+        id=3,
+        callback_title="Report",
+        callback_description=None,
+        callback_partition_key=None,
+        callback_timeout=120.0
+    )
+    result = MagicMock()
+    result.all.return_value = [row]
+    mock_session.execute.return_value = result
+
+    def _flush_defaults(task):
+        task.id = 10
+        task.created_at = task.updated_at = datetime.now(timezone.utc)
+    mock_session.add.side_effect = _flush_defaults
+    service = TaskGroupService(mock_session)
+
+    callbacks = await service.finish_groups([3])
+
+    assert callbacks[0].timeout == 120.0
+
+@pytest.mark.asyncio
+async def test_finish_groups_without_groups_skips_query(mock_session):
+    service = TaskGroupService(mock_session)
+
+    assert await service.finish_groups([]) == []
+    mock_session.execute.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_create_group_retry_after_failed_publish(mock_session):
+    existing = MagicMock()
+    existing.id = 3
+    existing.total = 2
+    existing.completed = existing.failed = existing.cancelled = 0
+    existing.callback_task_id = existing.finished_at = None
+    existing.created_at = datetime.now(timezone.utc)
+    existing.inserted = False
+    pending = MagicMock()
+    pending.all.return_value = [(11, None), (12, "tenant-a")]
+    mock_session.execute.side_effect = [MagicMock(one=MagicMock(return_value=existing)), pending]
+    service = TaskGroupService(mock_session)
+
+    group, tasks = await service.create_group(TaskGroupCreate(tasks=[TaskCreate(title="t")] * 2), "key-1")
+
+    # Повтор отдаёт на публикацию дочерние задачи, которые ещё не взяты в работу
+    assert group.id == 3
+    assert tasks == [(11, None), (12, "tenant-a")]
+    assert "status" in _compiled_sql(mock_session.execute.call_args_list[1])
+
+@pytest.mark.asyncio
+async def test_get_group_not_found(mock_session):
+    mock_session.get.return_value = None
+    service = TaskGroupService(mock_session)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.get_group(42)
+
+    assert exc_info.value.status_code == 404
+
+def test_group_read_progress():
+    group = TaskGroup(
+        id=1,
+        total=10,
+        completed=6,
+        failed=1,
+        cancelled=1,
+        created_at=datetime.now(timezone.utc)
+    )
+
+    result = TaskGroupRead.model_validate(group, from_attributes=True)
+
+    assert result.pending == 2
+    assert result.finished is False
+
+def test_group_create_requires_tasks():
+    with pytest.raises(ValueError):
+        TaskGroupCreate(tasks=[])
+    assert TaskGroupCreate(tasks=[TaskCreate(title="t")]).callback is None
@@ -1,8 +1,8 @@
 import pytest
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 from app.core.service.task import TaskService
 from app.db import Task, StatusTask
-from app.core.schemas.task import TaskCreate, TaskUpdate, TaskRead
+from app.core.schemas.task import TaskBulkFilter, TaskCreate, TaskUpdate, TaskRead
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
 from fastapi import HTTPException
@@ -72,6 +72,23 @@ async def test_update_task_status_success(mock_session):
     assert result.result == "Success"
     mock_session.commit.assert_awaited_once()
 
+@pytest.mark.asyncio
+async def test_update_task_status_locks_fresh_row(mock_session):
+    task = Task(
+        id=1,
+        title="Test",
+        status=StatusTask.NEW_TASK,
+        created_at=datetime.now(timezone.utc),
+        updated_at=datetime.now(timezone.utc)
+    )
+    mock_session.get.return_value = task
+    service = TaskService(mock_session)
+
+    await service.update_task_status(1, StatusTask.CANCELLED)
+
+    # Прежний статус читается из БД, а не из identity map сессии
+    mock_session.get.assert_awaited_once_with(Task, 1, with_for_update=True, populate_existing=True)
+
 @pytest.mark.asyncio
 async def test_get_tasks_with_filter(mock_session):
     mock_tasks = [
@@ -87,6 +104,21 @@ async def test_get_tasks_with_filter(mock_session):
     assert all(isinstance(task, TaskRead) for task in results)
     assert all(task.status == StatusTask.NEW_TASK for task in results)
 
+@pytest.mark.asyncio
+async def test_get_tasks_reads_orm_objects(mock_session):
+    now = datetime.now(timezone.utc)
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = [
+        Task(id=1, title="Test1", status=StatusTask.NEW_TASK, created_at=now, updated_at=now)
+    ]
+    mock_session.execute.return_value = result
+    service = TaskService(mock_session)
+
+    results = await service.get_tasks()
+
+    assert [task.id for task in results] == [1]
+    result.scalars.assert_called_once()
+
 @pytest.mark.asyncio
 async def test_update_task_partial_data(mock_session):
     original_task = Task(
@@ -130,4 +162,153 @@ async def test_update_task_not_found(mock_session):
         await service.update_task(999, TaskUpdate(title="New"))
     
     assert exc_info.value.status_code == 404
-    assert "Task with id 999 not found" in str(exc_info.value.detail)
\ No newline at end of file
+    assert "Task with id 999 not found" in str(exc_info.value.detail)
+
+@pytest.mark.asyncio
+async def test_retry_failed_tasks_returns_ids(mock_session):
+    result = MagicMock()
+    result.all.return_value = [
+        (1, None, None, StatusTask.ERROR),
+        (2, "tenant-a", None, StatusTask.ERROR),
+        (3, None, None, StatusTask.ERROR)
+    ]
+    mock_session.execute.return_value = result
+    service = TaskService(mock_session)
+
+    tasks = await service.retry_failed_tasks()
+
+    assert tasks == [(1, None), (2, "tenant-a"), (3, None)]
+    mock_session.execute.assert_awaited_once()
+    mock_session.commit.assert_awaited_once()
+
+def test_bulk_filter_requires_criteria():
+    with pytest.raises(ValueError):
+        TaskBulkFilter()
+
+def _idempotent_row(inserted: bool, created_at: datetime):
+    row = MagicMock()
+    row.id = 7
+    row.title = "Test"
+    row.description = None
+    row.partition_key = None
+    row.group_id = None
+    row.status = StatusTask.NEW_TASK
+    row.created_at = created_at
+    row.updated_at = created_at
+    row.result = None
+    row.error_message = None
+    row.inserted = inserted
+    return row
+
+@pytest.mark.asyncio
+async def test_create_task_idempotent_returns_existing(mock_session):
+    row = _idempotent_row(False, datetime.now(timezone.utc))
+    row.status = StatusTask.PROCESS_TASK
+    result = MagicMock()
+    result.one.return_value = row
+    mock_session.execute.return_value = result
+    service = TaskService(mock_session)
+
+    task, needs_publish = await service.create_task_idempotent(TaskCreate(title="Test"), "key-1")
+
+    assert needs_publish is False
+    assert task.id == 7
+    mock_session.execute.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_create_task_idempotent_retry_after_failed_publish(mock_session):
+    # Первая попытка сохранила задачу, но публикация не прошла - задача всё ещё new_task
+    result = MagicMock()
+    result.one.return_value = _idempotent_row(False, datetime.now(timezone.utc))
+    mock_session.execute.return_value = result
+    service = TaskService(mock_session)
+
+    task, needs_publish = await service.create_task_idempotent(TaskCreate(title="Test"), "key-1")
+
+    assert needs_publish is True
+    assert task.id == 7
+
+@pytest.mark.asyncio
+async def test_create_task_idempotent_releases_expired_key(mock_session):
+    expired = _idempotent_row(False, datetime(2000, 1, 1, tzinfo=timezone.utc))
+    fresh = _idempotent_row(True, datetime.now(timezone.utc))
+    result = MagicMock()
+    result.one.side_effect = [expired, fresh]
+    mock_session.execute.return_value = result
+    service = TaskService(mock_session)
+
+    _, created = await service.create_task_idempotent(TaskCreate(title="Test"), "key-1")
+
+    assert created is True
+    assert mock_session.execute.await_count == 3
+
+@pytest.mark.asyncio
+async def test_get_task_falls_back_to_primary_when_replica_lags(mock_session):
+    task = Task(
+        id=5,
+        title="Test",
+        status=StatusTask.NEW_TASK,
+        created_at=datetime.now(timezone.utc),
+        updated_at=datetime.now(timezone.utc)
+    )
+    mock_session.info = {}
+    mock_session.get.side_effect = [None, task]
+    service = TaskService(mock_session, read_replica=True)
+
+    result = await service.get_task(5)
+
+    assert result.id == 5
+    assert mock_session.get.await_count == 2
+
+@pytest.mark.asyncio
+async def test_claim_task_skips_non_processable(mock_session):
+    result = MagicMock()
+    result.one_or_none.return_value = None
+    mock_session.execute.return_value = result
+    service = TaskService(mock_session)
+
+    assert await service.claim_task(1) is None
+    mock_session.execute.assert_awaited_once()
+    # Задача в error не захватывается: её возвращают через retry-failed, requeue или повтор DLQ
+    query = str(mock_session.execute.call_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+    assert "'NEW_TASK'" in query or "'new_task'" in query
+    assert "'ERROR'" not in query and "'error'" not in query
+
+@pytest.mark.asyncio
+async def test_cancel_completed_task_conflict(mock_session):
+    result = MagicMock()
+    result.all.return_value = []
+    mock_session.execute.return_value = result
+    mock_session.expire_all = MagicMock()
+    mock_session.get.return_value = Task(
+        id=1,
+        title="Test",
+        status=StatusTask.COMPLETED_TASK,
+        created_at=datetime.now(timezone.utc),
+        updated_at=datetime.now(timezone.utc)
+    )
+    service = TaskService(mock_session)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.cancel_task(1)
+
+    assert exc_info.value.status_code == 409
+
+@pytest.mark.asyncio
+async def test_cancel_tasks_returns_affected_groups(mock_session):
+    result = MagicMock()
+    result.all.return_value = [
+        (1, None, 4, StatusTask.NEW_TASK),
+        (2, None, None, StatusTask.NEW_TASK),
+        (3, None, 4, StatusTask.NEW_TASK)
+    ]
+    mock_session.execute.return_value = result
+    service = TaskService(mock_session)
+
+    tasks, group_ids = await service.cancel_tasks(TaskBulkFilter(ids=[1, 2, 3]))
+
+    assert tasks == [(1, None), (2, None), (3, None)]
+    assert group_ids == {4}
+    # Упавшие задачи не отменяются, как и в cancel_task
+    query = str(mock_session.execute.call_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+    assert "'ERROR'" not in query and "'error'" not in query
@@ -0,0 +1,50 @@
+import json
+import pytest
+from unittest.mock import patch
+
+from app.utils.tracing import BatchSpanExporter, extract, inject, start_span, write_jsonl
+
+def test_inject_extract_roundtrip():
+    with patch('app.utils.tracing.settings.TRACE_SAMPLE_RATE', 1.0), \
+         patch('app.utils.tracing.exporter'):
+        with start_span("publish") as span:
+            headers = inject({"retry_count": 0})
+
+    context = extract(headers)
+
+    assert context.trace_id == span.context.trace_id
+    assert context.span_id == span.context.span_id
+    assert context.sampled is True
+
+def test_extract_ignores_invalid_headers():
+    assert extract(None) is None
+    assert extract({"traceparent": "garbage"}) is None
+
+def test_children_inherit_sampling_decision():
+    with patch('app.utils.tracing.settings.TRACE_SAMPLE_RATE', 0.0), \
+         patch('app.utils.tracing.exporter') as mock_exporter:
+        with start_span("root") as root:
+            with start_span("child") as child:
+                pass
+
+    assert child.context.trace_id == root.context.trace_id
+    assert child.parent_id == root.context.span_id
+    assert child.context.sampled is False
+    mock_exporter.export.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_exporter_writes_jsonl(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = BatchSpanExporter(write_jsonl(str(path)), batch_size=2, interval=60, max_queue=10)
+
+    with patch('app.utils.tracing.settings.TRACE_SAMPLE_RATE', 1.0), \
+         patch('app.utils.tracing.exporter', exporter):
+        with start_span("parent", task_id=1):
+            with start_span("db"):
+                pass
+        await exporter.shutdown()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [span["name"] for span in spans] == ["db", "parent"]
+    assert spans[0]["parent_id"] == spans[1]["span_id"]
+    assert spans[1]["attributes"] == {"task_id": 1}
@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aio_pika.exceptions import AMQPConnectionError
+from app.core.schemas.task import TaskRead
+from app.db import StatusTask
+from app.worker.process import _cancel_requests, _run_handler, _running_handlers, cancel_running_task, process_task
+
+@pytest.fixture(autouse=True)
+def worker_state():
+    # Реестры обработчиков и отложенных отмен общие для процесса
+    yield
+    _running_handlers.clear()
+    _cancel_requests.clear()
+
+async def _slow_handler(task_id: int) -> float:
+    await asyncio.sleep(10)
+    return 10.0
+
+@pytest.mark.asyncio
+async def test_handler_timeout():
+    with patch('app.worker.process._simulate_processing', _slow_handler):
+        with pytest.raises(TimeoutError):
+            await _run_handler(1, timeout=0.01)
+
+    assert 1 not in _running_handlers
+
+@pytest.mark.asyncio
+async def test_cancel_running_handler():
+    with patch('app.worker.process._simulate_processing', _slow_handler):
+        running = asyncio.create_task(_run_handler(2, timeout=5))
+        await asyncio.sleep(0)
+
+        assert cancel_running_task(2) is True
+        with pytest.raises(asyncio.CancelledError):
+            await running
+
+    assert 2 not in _running_handlers
+
+def _task(task_id: int, **fields) -> TaskRead:
+    now = datetime.now(timezone.utc)
+    return TaskRead(id=task_id, title="Test", status=StatusTask.NEW_TASK, created_at=now, updated_at=now, **fields)
+
+@pytest.fixture
+def service():
+    with patch('app.worker.process.async_session'), \
+         patch('app.worker.process.TaskService') as mock_service:
+        service = mock_service.return_value
+        service.claim_task = AsyncMock()
+        service.update_task_status = AsyncMock()
+        yield service
+
+def _final_status(service) -> StatusTask:
+    return service.update_task_status.call_args[0][1]
+
+@pytest.mark.asyncio
+async def test_process_task_success_finishes_group(service):
+    service.claim_task.return_value = _task(3, group_id=7)
+    callback = MagicMock(id=10, partition_key=None)
+
+    async def _fast_handler(task_id: int) -> float:
+        return 0.1
+
+    with patch('app.worker.process._simulate_processing', _fast_handler), \
+         patch('app.worker.process._should_fail', AsyncMock(return_value=False)), \
+         patch('app.worker.process.TaskGroupService') as mock_groups, \
+         patch('app.worker.process.publish_task') as mock_publish:
+        mock_groups.return_value.finish_groups = AsyncMock(return_value=[callback])
+
+        await process_task(3)
+
+        assert _final_status(service) == StatusTask.COMPLETED_TASK
+        mock_groups.return_value.finish_groups.assert_awaited_once_with([7])
+        mock_publish.assert_awaited_once_with(10, None)
+
+@pytest.mark.asyncio
+async def test_callback_publish_failure_keeps_child_status(service):
+    service.claim_task.return_value = _task(3, group_id=7)
+    callback = MagicMock(id=10, partition_key=None)
+
+    async def _fast_handler(task_id: int) -> float:
+        return 0.1
+
+    with patch('app.worker.process._simulate_processing', _fast_handler), \
+         patch('app.worker.process._should_fail', AsyncMock(return_value=False)), \
+         patch('app.worker.process.TaskGroupService') as mock_groups, \
+         patch('app.worker.process.publish_task', side_effect=AMQPConnectionError()):
+        mock_groups.return_value.finish_groups = AsyncMock(return_value=[callback])
+
+        await process_task(3)
+
+    # Завершённая задача не переводится в error из-за сбоя публикации обратного вызова
+    service.update_task_status.assert_awaited_once()
+    assert _final_status(service) == StatusTask.COMPLETED_TASK
+
+@pytest.mark.asyncio
+async def test_process_task_timeout_marks_error(service):
+    service.claim_task.return_value = _task(4, timeout=0.01)
+
+    with patch('app.worker.process._simulate_processing', _slow_handler):
+        await process_task(4)
+
+    assert _final_status(service) == StatusTask.ERROR
+    assert "Timed out" in service.update_task_status.call_args.kwargs["error_message"]
+
+@pytest.mark.asyncio
+async def test_process_task_cancel_request_marks_cancelled(service):
+    service.claim_task.return_value = _task(5)
+
+    with patch('app.worker.process._simulate_processing', _slow_handler):
+        running = asyncio.create_task(process_task(5))
+        while not cancel_running_task(5):
+            await asyncio.sleep(0)
+        await running
+
+    assert _final_status(service) == StatusTask.CANCELLED
+
+@pytest.mark.asyncio
+async def test_process_task_skips_unclaimed_task(service):
+    service.claim_task.return_value = None
+
+    with patch('app.worker.process._run_handler') as mock_run:
+        await process_task(6)
+
+    mock_run.assert_not_called()
+    service.update_task_status.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_cancel_before_handler_start_is_applied():
+    # Команда пришла раньше, чем воркер зарегистрировал обработчик
+    assert cancel_running_task(8) is False
+
+    with patch('app.worker.process._simulate_processing', _slow_handler):
+        with pytest.raises(asyncio.CancelledError):
+            await _run_handler(8, timeout=5)